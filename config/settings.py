@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import json
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -148,12 +149,21 @@ if CACHE_ENABLE:
         }
     }
 
+# Двухуровневый кэш данных: LRU в памяти процесса (размер, срок жизни, сек.) перед Redis
+MAILING_LOCAL_CACHE_SIZE = int(os.getenv('MAILING_LOCAL_CACHE_SIZE', 256))
+MAILING_LOCAL_CACHE_TTL = float(os.getenv('MAILING_LOCAL_CACHE_TTL', 5))
+MAILING_CACHE_TIMEOUT = int(os.getenv('MAILING_CACHE_TIMEOUT', 60 * 60))
+
+# Страницы в кэше сбрасываются сигналами при изменении данных, поэтому могут храниться долго
+VIEW_CACHE_TIMEOUT = int(os.getenv('VIEW_CACHE_TIMEOUT', 60 * 60 * 24))
+
 AUTH_USER_MODEL = 'users.User'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedRolesBackend']
 LOGIN_REDIRECT_URL = 'mailing:home'
 LOGOUT_REDIRECT_URL = 'mailing:home'
 LOGIN_URL = 'users:login'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = 'mailing.relays.RelayEmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST')
 EMAIL_PORT = os.getenv('EMAIL_PORT')
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
@@ -162,3 +172,33 @@ EMAIL_USE_TLS = False
 EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Несколько SMTP-серверов с весами (mailing/relays.py), JSON-список вида
+# [{"host": "smtp1.example.com", "port": 465, "username": "...", "password": "...", "use_ssl": true, "weight": 3}].
+# Пустой список - один сервер из EMAIL_HOST/EMAIL_PORT
+EMAIL_RELAYS = json.loads(os.getenv('EMAIL_RELAYS', '[]'))
+# Сервер выводится из ротации после стольких ошибок подряд и проверяется снова через EMAIL_RELAY_OPEN_TIMEOUT сек.
+EMAIL_RELAY_FAILURE_THRESHOLD = int(os.getenv('EMAIL_RELAY_FAILURE_THRESHOLD', 3))
+EMAIL_RELAY_OPEN_TIMEOUT = float(os.getenv('EMAIL_RELAY_OPEN_TIMEOUT', 30))
+EMAIL_RELAY_TIMEOUT = float(os.getenv('EMAIL_RELAY_TIMEOUT', 10))
+
+# Пул постоянных SMTP-соединений (mailing/smtp_pool.py)
+EMAIL_POOL_SIZE = int(os.getenv('EMAIL_POOL_SIZE', 4))
+EMAIL_POOL_IDLE_TIMEOUT = int(os.getenv('EMAIL_POOL_IDLE_TIMEOUT', 60))
+
+# Транспорт отправки рассылок: "pool" - пул SMTP-соединений, "async" - асинхронный движок (mailing/async_sender.py)
+MAILING_SEND_ENGINE = os.getenv('MAILING_SEND_ENGINE', 'pool')
+MAILING_ASYNC_CONNECTIONS = int(os.getenv('MAILING_ASYNC_CONNECTIONS', 4))
+MAILING_ASYNC_CONCURRENCY = int(os.getenv('MAILING_ASYNC_CONCURRENCY', 100))
+
+# Ограничение скорости отправки, писем в минуту (0 - без ограничения), см. mailing/ratelimit.py.
+# Лимит общий для всех воркеров только при CACHE_ENABLE: корзины токенов хранятся в кэше
+MAILING_RATE_LIMIT_HOST = int(os.getenv('MAILING_RATE_LIMIT_HOST', 0))
+MAILING_RATE_LIMIT_OWNER = int(os.getenv('MAILING_RATE_LIMIT_OWNER', 0))
+MAILING_RATE_LIMIT_BURST = int(os.getenv('MAILING_RATE_LIMIT_BURST', 10))
+# Период догрузки новых адресов из списка блокировки в память воркера, сек.
+MAILING_SUPPRESSION_REFRESH = float(os.getenv('MAILING_SUPPRESSION_REFRESH', 60))
+# Повторы при временных ошибках SMTP (mailing/retry.py): число повторов, базовая и предельная задержка, сек.
+MAILING_RETRY_MAX = int(os.getenv('MAILING_RETRY_MAX', 5))
+MAILING_RETRY_BASE_DELAY = int(os.getenv('MAILING_RETRY_BASE_DELAY', 60))
+MAILING_RETRY_MAX_DELAY = int(os.getenv('MAILING_RETRY_MAX_DELAY', 60 * 60 * 6))
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from mailing.models import Mailing, MailingAttempt, Message, RecipientMailing
+from mailing.models import (Mailing, MailingAttempt, MailingDelivery, MailingJob, Message, RecipientMailing,
+                            SuppressedEmail)
 
 
 @admin.register(RecipientMailing)
@@ -29,3 +30,23 @@ class MailingAttemptAdmin(admin.ModelAdmin):
     list_display = ("id", "owner", "date_attempt", "status")
     search_fields = ("owner",)
     list_filter = ("owner",)
+
+
+@admin.register(MailingJob)
+class MailingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "mailing", "status", "run_after", "attempts", "owner")
+    list_filter = ("status",)
+
+
+@admin.register(MailingDelivery)
+class MailingDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("id", "mailing", "email", "status", "smtp_code", "retries", "next_retry_at", "date_delivery")
+    search_fields = ("email",)
+    list_filter = ("status",)
+
+
+@admin.register(SuppressedEmail)
+class SuppressedEmailAdmin(admin.ModelAdmin):
+    list_display = ("id", "email", "reason", "created_at")
+    search_fields = ("email",)
+    list_filter = ("reason",)
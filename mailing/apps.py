@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MailingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mailing"
+
+    def ready(self):
+        import mailing.checks  # noqa: F401
+        import mailing.signals  # noqa: F401
@@ -0,0 +1,311 @@
+import asyncio
+import base64
+import ssl
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+
+from mailing.ratelimit import host_limiter
+from mailing.relays import RELAY_OPTIONS, choose_relay, get_relay_health, get_relays
+from mailing.smtp_pool import SendResult
+
+SMTP_ERRORS = (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+class AsyncSMTPError(Exception):
+    """Ошибка протокола асинхронного SMTP-клиента"""
+
+    def __init__(self, code, text):
+        super().__init__(f"{code} {text}")
+        self.code = code
+        self.text = text
+
+
+class AsyncSMTPConnection:
+    """Минимальный асинхронный SMTP-клиент с конвейерной отправкой команд (PIPELINING, RFC 2920).
+
+    Ответы сервера читает отдельная задача и раздает их ожидающим в порядке отправки команд,
+    поэтому пока одна транзакция ждет итогового ответа на письмо, следующая уже передает свои команды.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_ssl=False, use_tls=False, timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.pipelining = False
+        self.in_flight = 0
+        self._reader = None
+        self._writer = None
+        self._replies = deque()
+        self._read_task = None
+        self._write_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self._writer is not None and not self._writer.is_closing() and not self._read_task.done()
+
+    async def connect(self):
+        """Подключение, приветствие EHLO и авторизация"""
+        async with self._connect_lock:
+            if self._writer is not None and self.is_open:
+                return
+            context = ssl.create_default_context() if self.use_ssl else None
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+            )
+            self._replies.clear()
+            greeting = asyncio.get_running_loop().create_future()
+            self._replies.append(greeting)
+            self._read_task = asyncio.create_task(self._read_replies())
+            await self._check(greeting, 220)
+            extensions = await self._ehlo()
+            if self.use_tls:
+                await self._check(self._write(b"STARTTLS\r\n"), 220)
+                await self._writer.start_tls(ssl.create_default_context())
+                extensions = await self._ehlo()
+            self.pipelining = "PIPELINING" in extensions
+            if self.username:
+                credentials = f"\0{self.username}\0{self.password}".encode()
+                command = b"AUTH PLAIN " + base64.b64encode(credentials) + b"\r\n"
+                await self._check(self._write(command), 235)
+
+    async def _ehlo(self):
+        code, text = await self._check(self._write(b"EHLO localhost\r\n"), 250)
+        return {line.split(" ", 1)[0].upper() for line in text.splitlines()}
+
+    async def _read_replies(self):
+        """Чтение ответов сервера и передача их ожидающим командам по порядку"""
+        try:
+            while True:
+                lines = []
+                while True:
+                    line = await self._reader.readline()
+                    if not line:
+                        raise ConnectionResetError("Сервер закрыл соединение")
+                    lines.append(line.decode(errors="replace").rstrip("\r\n"))
+                    if line[3:4] != b"-":
+                        break
+                reply = (int(lines[-1][:3]), "\n".join(item[4:] for item in lines))
+                future = self._replies.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except (*SMTP_ERRORS, ValueError, IndexError) as error:
+            while self._replies:
+                future = self._replies.popleft()
+                if not future.done():
+                    future.set_exception(ConnectionResetError(str(error)))
+
+    def _write(self, data, replies=1):
+        """Отправка данных без ожидания ответа, возвращает future ответа (или список future)"""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in range(replies)]
+        self._replies.extend(futures)
+        self._writer.write(data)
+        return futures[0] if replies == 1 else futures
+
+    async def _check(self, future, expected):
+        code, text = await asyncio.wait_for(future, self.timeout)
+        if code != expected:
+            raise AsyncSMTPError(code, text)
+        return code, text
+
+    async def send(self, from_email, recipients, payload):
+        """Отправка одного письма, возвращает SendResult"""
+        if not self.is_open:
+            await self.connect()
+        self.in_flight += 1
+        try:
+            async with self._write_lock:
+                commands = [f"MAIL FROM:<{from_email}>\r\n".encode()]
+                commands += [f"RCPT TO:<{recipient}>\r\n".encode() for recipient in recipients]
+                commands.append(b"DATA\r\n")
+                if self.pipelining:
+                    futures = self._write(b"".join(commands), replies=len(commands))
+                else:
+                    futures = []
+                    for command in commands:
+                        futures.append(self._write(command))
+                        await asyncio.wait_for(asyncio.shield(futures[-1]), self.timeout)
+                data_code, data_text = await asyncio.wait_for(futures[-1], self.timeout)
+                if data_code != 354:
+                    self._write(b"RSET\r\n")
+                    end_reply = None
+                else:
+                    end_reply = self._write(_dot_stuff(payload) + b".\r\n")
+                    await self._writer.drain()
+                    if not self.pipelining:
+                        await asyncio.wait_for(asyncio.shield(end_reply), self.timeout)
+            # Блокировка записи снята: следующая транзакция передает команды, пока мы ждем ответ на письмо
+            # Первый ответ - на MAIL FROM, остальные - на RCPT TO
+            for index, future in enumerate(futures[:-1]):
+                code, text = await asyncio.wait_for(future, self.timeout)
+                if code >= 400:
+                    return SendResult(code, text, recipient_refused=index > 0)
+            if end_reply is None:
+                return SendResult(data_code, data_text)
+            return SendResult(*await asyncio.wait_for(end_reply, self.timeout))
+        finally:
+            self.in_flight -= 1
+
+    async def close(self):
+        """Завершение сеанса командой QUIT"""
+        if self._writer is None:
+            return
+        try:
+            if self.is_open:
+                self._write(b"QUIT\r\n")
+                await self._writer.drain()
+            self._writer.close()
+        except SMTP_ERRORS:
+            pass
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self._writer = None
+
+
+def _dot_stuff(payload):
+    """Экранирование строк, начинающихся с точки, и завершение письма переводом строки"""
+    if payload.startswith(b"."):
+        payload = b"." + payload
+    payload = payload.replace(b"\r\n.", b"\r\n..")
+    if not payload.endswith(b"\r\n"):
+        payload += b"\r\n"
+    return payload
+
+
+class AsyncSendingEngine:
+    """Асинхронная отправка писем: много SMTP-транзакций одновременно поверх небольшого числа соединений.
+
+    Цикл событий работает в отдельном потоке, поэтому движок вызывается из обычного синхронного кода
+    (воркер очереди, команды manage.py) так же, как пул SMTP-соединений: deliver_messages(messages).
+    Письма распределяются по реле EMAIL_RELAYS так же, как в RelayEmailBackend: с учетом веса,
+    задержки и состояния реле, при ошибке сервера - через следующее реле. Явно переданный host
+    заменяет список реле одним сервером.
+    """
+
+    def __init__(self, connections=None, concurrency=None, host=None, port=None, username=None, password=None,
+                 use_ssl=None, use_tls=None, timeout=None):
+        self.connections = connections or settings.MAILING_ASYNC_CONNECTIONS
+        self.concurrency = concurrency or settings.MAILING_ASYNC_CONCURRENCY
+        defaults = {
+            "host": host or settings.EMAIL_HOST,
+            "port": port or settings.EMAIL_PORT,
+            "username": settings.EMAIL_HOST_USER if username is None else username,
+            "password": settings.EMAIL_HOST_PASSWORD if password is None else password,
+            "use_ssl": settings.EMAIL_USE_SSL if use_ssl is None else use_ssl,
+            "use_tls": settings.EMAIL_USE_TLS if use_tls is None else use_tls,
+            "timeout": timeout or settings.EMAIL_TIMEOUT or 30,
+        }
+        self.relays = []
+        for config in ([{}] if host else get_relays()):
+            connection_kwargs = {**defaults, **{key: config[key] for key in RELAY_OPTIONS if key in config}}
+            health = get_relay_health({**config, "host": connection_kwargs["host"], "port": connection_kwargs["port"]})
+            self.relays.append((health, connection_kwargs))
+        self._loop = None
+        self._thread = None
+        self._pools = {}
+        self._semaphore = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запуск цикла событий движка в фоновом потоке"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="async-sender", daemon=True)
+                self._thread.start()
+                self._submit(self._setup())
+        return self
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._pools = {
+            health.name: [AsyncSMTPConnection(**connection_kwargs) for _ in range(self.connections)]
+            for health, connection_kwargs in self.relays
+        }
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @staticmethod
+    async def _wait(limiter):
+        # Кэш ограничителя синхронный, обращаемся к нему вне цикла событий
+        await asyncio.sleep(await asyncio.to_thread(limiter.reserve))
+
+    async def _send_one(self, message, limiter=None):
+        if limiter is not None:
+            await self._wait(limiter)
+        async with self._semaphore:
+            tried = set()
+            result = None, "Нет доступных SMTP-серверов"
+            while (relay := choose_relay(self.relays, tried)) is not None:
+                health, _ = relay
+                tried.add(health.name)
+                if not health.begin():
+                    continue
+                relay_limiter = host_limiter(health.name)
+                if relay_limiter is not None:
+                    await self._wait(relay_limiter)
+                connection = min(self._pools[health.name], key=lambda item: item.in_flight)
+                started = time.monotonic()
+                try:
+                    result = await connection.send(*message)
+                except AsyncSMTPError as error:
+                    if error.code >= 500:
+                        # Сервер ответил постоянным отказом (например, при авторизации) - реле исправно
+                        health.record_success(time.monotonic() - started)
+                        return error.code, error.text
+                    result = error.code, error.text
+                except SMTP_ERRORS as error:
+                    # Соединение оборвалось: следующая транзакция на нем переподключится
+                    result = None, str(error) or error.__class__.__name__
+                else:
+                    health.record_success(time.monotonic() - started)
+                    return result
+                health.record_failure()
+                await connection.close()
+            return result
+
+    async def deliver(self, email_messages, limiter=None):
+        """Конкурентная отправка писем, результаты возвращаются в порядке писем"""
+        prepared = [_prepare(message) for message in email_messages]
+        return await asyncio.gather(*(self._send_one(message, limiter) for message in prepared))
+
+    def deliver_messages(self, email_messages, limiter=None):
+        """Синхронная обертка над deliver(): список (код SMTP, ответ) по каждому письму"""
+        self.start()
+        return self._submit(self.deliver(email_messages, limiter))
+
+    def send_messages(self, email_messages):
+        """Отправка пачки писем, возвращает количество принятых сервером"""
+        return sum(1 for code, *_ in self.deliver_messages(email_messages) if code is not None and code < 400)
+
+    async def _close_connections(self):
+        await asyncio.gather(*(connection.close() for pool in self._pools.values() for connection in pool))
+
+    def close(self):
+        """Закрытие соединений и остановка цикла событий"""
+        with self._lock:
+            if self._loop is None:
+                return
+            self._submit(self._close_connections())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+
+
+def _prepare(email_message):
+    """Адрес отправителя, получатели и байты письма из django EmailMessage"""
+    encoding = email_message.encoding or settings.DEFAULT_CHARSET
+    from_email = sanitize_address(email_message.from_email, encoding)
+    recipients = [sanitize_address(address, encoding) for address in email_message.recipients()]
+    return from_email, recipients, email_message.message().as_bytes(linesep="\r\n")
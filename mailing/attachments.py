@@ -0,0 +1,47 @@
+import base64
+import mimetypes
+import mmap
+import os
+from email.mime.base import MIMEBase
+
+from mailing.lru_cache import LRUCache
+
+_parts = LRUCache(maxsize=16, ttl=60 * 60)
+
+
+def _read(path):
+    """Содержимое файла через отображение в память: без промежуточных копий при кодировании"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return base64.encodebytes(mapped)
+
+
+def build_attachment_part(path, filename):
+    """MIME-часть вложения, уже закодированная в base64"""
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    maintype, subtype = content_type.split("/", 1)
+    part = MIMEBase(maintype, subtype)
+    part.set_payload(_read(path).decode("ascii"))
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", "attachment", filename=filename)
+    return part
+
+
+def get_attachment_part(message):
+    """MIME-часть вложения сообщения или None.
+
+    Часть кодируется один раз и затем подключается по ссылке к письму каждого получателя.
+    Ключ кэша включает размер и время изменения файла, поэтому замена файла дает новую часть.
+    """
+    if not message.attachment:
+        return None
+    path = message.attachment.path
+    stat = os.stat(path)
+    key = f"{message.pk}:{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    part = _parts.get(key)
+    if part is None:
+        part = build_attachment_part(path, os.path.basename(message.attachment.name))
+        _parts.set(key, part)
+    return part
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def rate_limit_cache_check(app_configs, **kwargs):
+    """Лимиты скорости без общего кэша: корзины токенов и их блокировки у каждого процесса свои"""
+    if settings.CACHE_ENABLE or not (settings.MAILING_RATE_LIMIT_HOST or settings.MAILING_RATE_LIMIT_OWNER):
+        return []
+    return [
+        Warning(
+            "Лимиты скорости отправки заданы, а общий кэш выключен (CACHE_ENABLE)",
+            hint="Каждый процесс-воркер соблюдает лимит отдельно, реальная скорость кратна числу процессов. "
+                 "Включите CACHE_ENABLE, чтобы корзины токенов хранились в Redis.",
+            id="mailing.W001",
+        )
+    ]
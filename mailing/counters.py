@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from mailing import stampede
+from mailing.models import Mailing, RecipientMailing
+
+COUNTERS_TIMEOUT = 60 * 60
+VERSION_KEY = "home_counters:version"
+
+GLOBAL_COUNTERS = ("mailings", "mailings_started", "recipients")
+USER_COUNTERS = ("user_mailings", "user_mailings_started", "user_recipients")
+COUNTER_COLUMNS = ("mailings", "mailings_started", "user_mailings", "user_mailings_started", "recipients",
+                   "user_recipients")
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _key(version, name, user_id=None):
+    scope = "all" if name in GLOBAL_COUNTERS else user_id
+    return f"home_counters:{version}:{scope}:{name}"
+
+
+def counters_sql(user_id=None):
+    """SQL подсчета всех счетчиков главной страницы одним запросом с условной агрегацией"""
+    mailing_table = connection.ops.quote_name(Mailing._meta.db_table)
+    recipient_table = connection.ops.quote_name(RecipientMailing._meta.db_table)
+    sql = f"""
+        SELECT m.mailings, m.mailings_started, m.user_mailings, m.user_mailings_started,
+               r.recipients, r.user_recipients
+        FROM (
+            SELECT COUNT(*) AS mailings,
+                   COUNT(CASE WHEN status = %s THEN 1 END) AS mailings_started,
+                   COUNT(CASE WHEN owner_id = %s THEN 1 END) AS user_mailings,
+                   COUNT(CASE WHEN owner_id = %s AND status = %s THEN 1 END) AS user_mailings_started
+            FROM {mailing_table}
+        ) m CROSS JOIN (
+            SELECT COUNT(*) AS recipients,
+                   COUNT(CASE WHEN owner_id = %s THEN 1 END) AS user_recipients
+            FROM {recipient_table}
+        ) r
+    """
+    return sql, [Mailing.LAUNCHED, user_id, user_id, Mailing.LAUNCHED, user_id]
+
+
+def compute_counters(user_id=None):
+    """Подсчет счетчиков главной страницы в БД"""
+    with connection.cursor() as cursor:
+        cursor.execute(*counters_sql(user_id))
+        return dict(zip(COUNTER_COLUMNS, cursor.fetchone()))
+
+
+def get_home_counters(user):
+    """Счетчики главной страницы: при заполненном кэше без единого запроса к БД.
+
+    Кэшируются только в общем кэше (CACHE_ENABLE): изменения из воркера и других процессов
+    не попадают в локальный кэш процесса, и счетчики в нем расходились бы с БД.
+    """
+    user_id = user.pk if user.is_authenticated else None
+    names = GLOBAL_COUNTERS + (USER_COUNTERS if user_id else ())
+    if not settings.CACHE_ENABLE:
+        counters = compute_counters(user_id)
+        return {name: counters[name] for name in names}
+    version = _version()
+    keys = {_key(version, name, user_id): name for name in names}
+
+    def read():
+        cached = cache.get_many(keys)
+        if len(cached) == len(keys):
+            return {keys[key]: value for key, value in cached.items()}
+        return None
+
+    def compute():
+        counters = compute_counters(user_id)
+        cache.set_many({key: counters[name] for key, name in keys.items()}, COUNTERS_TIMEOUT)
+        return {name: counters[name] for name in names}
+
+    # После истечения или сброса версии пересчитывает один процесс, остальные ждут его результат
+    return read() or stampede.single_flight(f"home_counters:{version}:{user_id}", compute, read)
+
+
+def _increment(changes):
+    """Инкрементальное изменение счетчиков; отсутствующие в кэше будут пересчитаны при следующем чтении"""
+    if not settings.CACHE_ENABLE:
+        return
+    version = _version()
+    for (name, user_id), delta in changes.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(version, name, user_id), delta)
+        except ValueError:
+            pass
+
+
+def _mailing_counters(status, owner_id):
+    counters = [("mailings", None)]
+    if status == Mailing.LAUNCHED:
+        counters.append(("mailings_started", None))
+    if owner_id is not None:
+        counters.append(("user_mailings", owner_id))
+        if status == Mailing.LAUNCHED:
+            counters.append(("user_mailings_started", owner_id))
+    return counters
+
+
+def mailing_changed(old=None, new=None):
+    """Учет изменения рассылки, old/new - пары (статус, id владельца) или None"""
+    changes = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is not None:
+            for counter in _mailing_counters(*state):
+                changes[counter] = changes.get(counter, 0) + sign
+    _increment(changes)
+
+
+def recipient_changed(old_owner_id=None, new_owner_id=None, created=False, deleted=False):
+    """Учет добавления, удаления или смены владельца получателя"""
+    changes = {}
+    if created:
+        changes[("recipients", None)] = 1
+    if deleted:
+        changes[("recipients", None)] = -1
+    if old_owner_id is not None:
+        changes[("user_recipients", old_owner_id)] = -1
+    if new_owner_id is not None:
+        changes[("user_recipients", new_owner_id)] = changes.get(("user_recipients", new_owner_id), 0) + 1
+    _increment(changes)
+
+
+def invalidate():
+    """Сброс всех счетчиков (после массовых UPDATE, которые не вызывают сигналы)"""
+    if not settings.CACHE_ENABLE:
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
@@ -0,0 +1,166 @@
+import re
+from functools import lru_cache
+from html import escape
+from html.parser import HTMLParser
+
+from django.template.loader import get_template
+
+LAYOUT_TEMPLATE = "mailing/email/layout.html"
+
+STYLE_RE = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+CSS_AT_RULE_RE = re.compile(r"@[^{]+\{(?:[^{}]*\{[^{}]*\})*[^{}]*\}")
+SIMPLE_SELECTOR_RE = re.compile(r"^([a-z][a-z0-9]*)?(?:([.#])([\w-]+))?$", re.I)
+
+BLOCK_TAGS = {"p", "div", "br", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "hr"}
+SKIP_TAGS = {"style", "script", "head", "title"}
+
+
+@lru_cache(maxsize=None)
+def get_layout():
+    """Шаблон оформления письма, загруженный и разобранный один раз на процесс"""
+    return get_template(LAYOUT_TEMPLATE)
+
+
+def parse_css(html):
+    """Простые правила (тег, .класс, #id, тег.класс) из блоков <style> в порядке следования"""
+    rules = []
+    for css in STYLE_RE.findall(html):
+        css = CSS_AT_RULE_RE.sub("", CSS_COMMENT_RE.sub("", css))
+        for block in css.split("}"):
+            if "{" not in block:
+                continue
+            selectors, declarations = block.split("{", 1)
+            declarations = "; ".join(item.strip() for item in declarations.split(";") if item.strip())
+            for selector in selectors.split(","):
+                match = SIMPLE_SELECTOR_RE.match(selector.strip())
+                if match and any(match.groups()) and declarations:
+                    tag, kind, name = match.groups()
+                    rules.append(((tag or "").lower(), kind, name, declarations))
+    return rules
+
+
+class _CSSInliner(HTMLParser):
+    """Перенос правил из <style> в атрибуты style, остальная разметка копируется без изменений"""
+
+    def __init__(self, rules):
+        super().__init__(convert_charrefs=False)
+        self.rules = rules
+        self.parts = []
+
+    def _styled(self, tag, attrs):
+        values = dict(attrs)
+        classes = (values.get("class") or "").split()
+        styles = [
+            declarations for rule_tag, kind, name, declarations in self.rules
+            if (not rule_tag or rule_tag == tag)
+            and (kind is None or (kind == "." and name in classes) or (kind == "#" and name == values.get("id")))
+        ]
+        if not styles:
+            return None
+        if values.get("style"):
+            # Собственный style элемента важнее правил из <style>
+            styles.append(values["style"].strip().rstrip(";"))
+        attrs = [(key, value) for key, value in attrs if key != "style"] + [("style", "; ".join(styles))]
+        rendered = "".join(f' {key}="{escape(value or "", quote=True)}"' if value is not None else f" {key}"
+                           for key, value in attrs)
+        return f"<{tag}{rendered}>"
+
+    def handle_starttag(self, tag, attrs):
+        self.parts.append(self._styled(tag, attrs) or self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        styled = self._styled(tag, attrs)
+        self.parts.append(styled[:-1] + " />" if styled else self.get_starttag_text())
+
+    def handle_endtag(self, tag):
+        self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+    def handle_entityref(self, name):
+        self.parts.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.parts.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        self.parts.append(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self.parts.append(f"<!{decl}>")
+
+    def handle_pi(self, data):
+        self.parts.append(f"<?{data}>")
+
+    def unknown_decl(self, data):
+        self.parts.append(f"<![{data}]>")
+
+
+def inline_css(html):
+    """HTML со стилями в атрибутах style: почтовые клиенты часто игнорируют блоки <style>"""
+    rules = parse_css(html)
+    if not rules:
+        return html
+    inliner = _CSSInliner(rules)
+    inliner.feed(html)
+    inliner.close()
+    return "".join(inliner.parts)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip = 0
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+            if tag == "li":
+                self.parts.append("- ")
+        if tag == "a":
+            self.links.append((dict(attrs).get("href"), len(self.parts)))
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip = max(0, self.skip - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag == "a" and self.links:
+            href, start = self.links.pop()
+            text = "".join(self.parts[start:]).strip()
+            if href and not href.startswith("#") and href != text:
+                self.parts.append(f" ({href})")
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+
+def html_to_text(html):
+    """Текстовая альтернатива письма: текст без разметки, ссылки в скобках после текста"""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    lines = (line.strip() for line in "".join(extractor.parts).splitlines())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def render_html_skeleton(message):
+    """HTML письма без персональных данных: оформление, содержимое и встроенные стили.
+
+    Поля подстановки ({{ fio }} и др.) из содержимого остаются в тексте как есть, их заполняет
+    mailing.personalization для каждого получателя.
+    """
+    html = get_layout().render({"theme": message.theme, "content": message.html_content})
+    return inline_css(html)
+
+
+def escape_values(values):
+    """Значения полей подстановки для HTML-части письма"""
+    return {name: escape(str(value)) for name, value in values.items()}
@@ -0,0 +1,102 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from mailing.models import MailingAttempt, MailingDelivery
+
+EXPORT_CHUNK_SIZE = 2000
+
+ATTEMPT_COLUMNS = (
+    ("id", "id"),
+    ("mailing_id", "Рассылка"),
+    ("mailing__message__theme", "Тема сообщения"),
+    ("owner__email", "Владелец"),
+    ("date_attempt", "Дата"),
+    ("status", "Статус"),
+    ("server_response", "Ответ сервера"),
+)
+
+DELIVERY_COLUMNS = (
+    ("id", "id"),
+    ("mailing_id", "Рассылка"),
+    ("email", "Почта"),
+    ("status", "Статус"),
+    ("smtp_code", "Код SMTP"),
+    ("server_response", "Ответ сервера"),
+    ("date_delivery", "Дата"),
+)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: строка сразу возвращается, а не накапливается в памяти"""
+
+    def write(self, value):
+        return value
+
+
+class ExportFilterError(ValueError):
+    """Некорректный параметр фильтра выгрузки"""
+
+
+def parse_bound(value, end=False):
+    """Граница периода из даты или даты-времени; дата конца периода включается целиком"""
+    if not value:
+        return None
+    try:
+        # parse_* возвращают None для неверного формата и поднимают ValueError для несуществующей даты
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        raise ExportFilterError(f"Некорректная дата: {value}")
+    if moment is None:
+        if day is None:
+            raise ExportFilterError(f"Некорректная дата: {value}")
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_export(queryset, params, user, is_manager, date_field, owner_field):
+    """Фильтры выгрузки по рассылке, владельцу и периоду; обычный пользователь видит только свои данные"""
+    if not is_manager:
+        queryset = queryset.filter(**{owner_field: user.pk})
+    elif params.get("owner"):
+        queryset = queryset.filter(**{owner_field: _number(params["owner"], "owner")})
+    if params.get("mailing"):
+        queryset = queryset.filter(mailing_id=_number(params["mailing"], "mailing"))
+    date_from = parse_bound(params.get("date_from"))
+    date_to = parse_bound(params.get("date_to"), end=True)
+    if date_from:
+        queryset = queryset.filter(**{f"{date_field}__gte": date_from})
+    if date_to:
+        queryset = queryset.filter(**{f"{date_field}__lt": date_to})
+    return queryset
+
+
+def _number(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ExportFilterError(f"Некорректный параметр {name}: {value}")
+
+
+def attempts_queryset(params, user, is_manager):
+    queryset = MailingAttempt.objects.order_by("date_attempt", "id")
+    return filter_export(queryset, params, user, is_manager, "date_attempt", "owner_id")
+
+
+def deliveries_queryset(params, user, is_manager):
+    queryset = MailingDelivery.objects.order_by("date_delivery", "id")
+    return filter_export(queryset, params, user, is_manager, "date_delivery", "mailing__owner_id")
+
+
+def stream_csv(queryset, columns, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки CSV по мере чтения из БД: values_list без создания моделей, iterator без кэша QuerySet"""
+    writer = csv.writer(Echo())
+    yield "\ufeff" + writer.writerow([title for _, title in columns])
+    rows = queryset.values_list(*(field for field, _ in columns)).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow(row)
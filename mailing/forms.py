@@ -1,4 +1,4 @@
-from django.forms import BooleanField, ImageField, ModelForm
+from django.forms import BooleanField, DateTimeInput, FileField, Form, ImageField, ModelForm, ValidationError
 
 from mailing.models import Mailing, Message, RecipientMailing
 
@@ -22,19 +22,48 @@ class RecipientForm(StyleFormMixin, ModelForm):
         exclude = ['owner']
 
 
+class RecipientImportForm(StyleFormMixin, Form):
+    file = FileField(label="Файл CSV", help_text="Колонки: email, fio, comment (заголовок необязателен)")
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".txt")):
+            raise ValidationError("Поддерживаются только файлы CSV")
+        return file
+
+
 class MessageForm(StyleFormMixin, ModelForm):
     class Meta:
         model = Message
         fields = "__all__"
         exclude = ['owner']
+        help_texts = {
+            "content": "Поля подстановки для каждого получателя: {{ fio }}, {{ email }}, {{ comment }}",
+            "html_content": "Необязательно. Если заполнено, письмо отправляется в фирменном оформлении, "
+                            "а текстовая версия строится из HTML",
+        }
 
 
 class MailingForm(StyleFormMixin, ModelForm):
     class Meta:
         model = Mailing
         exclude = [
-            "first_sending",
-            "end_sending",
             "status",
             "owner"
         ]
+        widgets = {
+            "first_sending": DateTimeInput(attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"),
+            "end_sending": DateTimeInput(attrs={"type": "datetime-local"}, format="%Y-%m-%dT%H:%M"),
+        }
+        help_texts = {
+            "first_sending": "Рассылка запустится автоматически в указанное время",
+            "end_sending": "После этого времени рассылка будет завершена",
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        first_sending = cleaned_data.get("first_sending")
+        end_sending = cleaned_data.get("end_sending")
+        if first_sending and end_sending and end_sending <= first_sending:
+            raise ValidationError("Окончание отправки должно быть позже первой отправки")
+        return cleaned_data
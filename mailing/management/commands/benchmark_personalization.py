@@ -0,0 +1,39 @@
+import time
+
+from django.core.management import BaseCommand
+from django.template import Context, Template
+
+from mailing.models import Message, RecipientMailing
+from mailing.personalization import compile_message
+
+THEME = "{{ fio }}, специальное предложение"
+CONTENT = "Здравствуйте, {{ fio }}!\n\nПисьмо отправлено на {{ email }}. " + "Текст рассылки. " * 50
+
+
+class Command(BaseCommand):
+    help = "Скорость персонализации писем: компилированный шаблон против шаблона Django на каждого получателя"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, default=100000, help="Количество получателей")
+
+    def handle(self, *args, **options):
+        count = options["recipients"]
+        message = Message(pk=0, theme=THEME, content=CONTENT)
+        recipients = [RecipientMailing(fio=f"Получатель {index}", email=f"user{index}@example.com")
+                      for index in range(count)]
+
+        started = time.perf_counter()
+        compiled = compile_message(message)
+        for recipient in recipients:
+            compiled.render(recipient)
+        self.report("Компилированный шаблон", count, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for recipient in recipients:
+            context = Context({"fio": recipient.fio, "email": recipient.email}, autoescape=False)
+            Template(message.theme).render(context)
+            Template(message.content).render(context)
+        self.report("Шаблон Django на получателя", count, time.perf_counter() - started)
+
+    def report(self, title, count, elapsed):
+        self.stdout.write(f"{title:<30}{count / elapsed:>12.0f} писем/с ({elapsed:.2f} с)")
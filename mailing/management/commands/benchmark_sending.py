@@ -0,0 +1,100 @@
+import time
+
+from django.core.mail import EmailMessage
+from django.core.management import BaseCommand
+from django.test.utils import override_settings
+
+from mailing import counters
+from mailing.async_sender import AsyncSendingEngine
+from mailing.models import Mailing, Message, RecipientMailing
+from mailing.services import (DELIVERY_BATCH_SIZE, batched, finish_mailing_job, mailings_changed, send_mailing,
+                              start_mailing_job)
+from mailing.smtp_pool import SMTPConnectionPool
+from mailing.smtp_sink import sink_process
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ("Замер пропускной способности транспортов отправки (пул SMTP-соединений и асинхронный движок) "
+            "на локальном SMTP-сервере-заглушке: только транспорт и полный путь send_mailing с БД")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipients", type=int, nargs="+", default=[10_000, 100_000])
+        parser.add_argument("--connections", type=int, default=4, help="Соединений асинхронного движка")
+        parser.add_argument("--concurrency", type=int, default=100, help="Одновременных SMTP-транзакций")
+        parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа сервера на письмо, сек.")
+        parser.add_argument("--skip-sync", action="store_true", help="Не замерять пул SMTP-соединений")
+        parser.add_argument("--skip-db", action="store_true", help="Не замерять полный путь send_mailing с БД")
+
+    def handle(self, *args, **options):
+        with sink_process(latency=options["latency"]) as port:
+            smtp_settings = {
+                "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+                "EMAIL_HOST": "127.0.0.1",
+                "EMAIL_PORT": port,
+                "EMAIL_HOST_USER": "",
+                "EMAIL_HOST_PASSWORD": "",
+                "EMAIL_USE_SSL": False,
+                "EMAIL_USE_TLS": False,
+            }
+            with override_settings(**smtp_settings):
+                for total in options["recipients"]:
+                    # Только транспорт и для сравнения тот же транспорт под send_mailing
+                    runs = [("", self._run)]
+                    if not options["skip_db"]:
+                        runs.append(("send_mailing с БД, ", self._run_send_mailing))
+                    if not options["skip_sync"]:
+                        for prefix, run in runs:
+                            pool = SMTPConnectionPool(size=1)
+                            self._report(f"{prefix}пул SMTP-соединений (1 соед., последовательно)", total,
+                                         run(pool, total))
+                            pool.close()
+                    for prefix, run in runs:
+                        engine = AsyncSendingEngine(connections=options["connections"],
+                                                    concurrency=options["concurrency"])
+                        name = f"{prefix}async ({options['connections']} соед., {options['concurrency']} транзакций)"
+                        self._report(name, total, run(engine, total))
+                        engine.close()
+
+    @staticmethod
+    def _run(sender, total):
+        """Отправка total синтетических писем через транспорт пачками, без БД; возвращает время в секундах"""
+        addresses = (f"recipient{number}@example.com" for number in range(total))
+        started = time.perf_counter()
+        for batch in batched(addresses, DELIVERY_BATCH_SIZE):
+            messages = [EmailMessage("Тема", "Текст письма", "sender@example.com", [address]) for address in batch]
+            sender.deliver_messages(messages)
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _run_send_mailing(sender, total):
+        """Отправка рассылки на total синтетических получателей через send_mailing: снимок аудитории,
+        подстановка полей и фиксация доставок в БД; возвращает время в секундах"""
+        prefix = f"sendbench{time.time_ns()}"
+        owner = User.objects.create(email=f"{prefix}@example.com", username=prefix)
+        try:
+            message = Message.objects.create(theme="Тема", content="Здравствуйте, {{ fio }}! Текст письма.",
+                                             owner=owner)
+            mailing = Mailing.objects.create(message=message, owner=owner)
+            recipients = (RecipientMailing(email=f"{prefix}-r{number}@example.com", fio=f"Получатель {number}",
+                                           owner=owner) for number in range(total))
+            for batch in batched(recipients, DELIVERY_BATCH_SIZE):
+                mailing.recipients.add(*RecipientMailing.objects.bulk_create(batch))
+            # Отправка идет под заданием, чтобы ее не перехватил воркер
+            job = start_mailing_job(mailing, owner)
+            started = time.perf_counter()
+            send_mailing(mailing, owner, sender)
+            elapsed = time.perf_counter() - started
+            finish_mailing_job(job)
+            return elapsed
+        finally:
+            Mailing.objects.filter(owner=owner).delete()
+            Message.objects.filter(owner=owner).delete()
+            RecipientMailing.objects.filter(owner=owner).delete()
+            owner.delete()
+            # Массовая вставка не вызывает сигналы: сбрасываем кэши вручную
+            counters.invalidate()
+            mailings_changed()
+
+    def _report(self, name, total, elapsed):
+        self.stdout.write(f"{name}: {total} писем за {elapsed:.2f} с, {total / elapsed:.0f} писем/с")
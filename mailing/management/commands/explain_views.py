@@ -0,0 +1,67 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from mailing import views
+from mailing.counters import counters_sql
+from mailing.pagination import KeysetPaginationMixin
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Планы выполнения (EXPLAIN ANALYZE) основных запросов страниц рассылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="email пользователя, от имени которого строятся запросы")
+
+    def handle(self, *args, **options):
+        user = self._get_user(options["user"])
+        self.stdout.write(f"Пользователь: {user}\n")
+        for name, queryset in self._querysets(user):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(self._explain(queryset))
+            self.stdout.write("")
+
+    @staticmethod
+    def _get_user(email):
+        if email is None:
+            return User.objects.order_by("pk").first() or AnonymousUser()
+        try:
+            return User.objects.get(email=email)
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {email} не найден")
+
+    @staticmethod
+    def _view_queryset(view_class, user):
+        """Запрос списка так, как его строит представление для пользователя"""
+        view = view_class()
+        view.setup(RequestFactory().get("/"))
+        view.request.user = user
+        queryset = view.get_queryset()
+        if isinstance(view, KeysetPaginationMixin):
+            # Первая страница так, как ее запрашивает постраничный вывод по ключу
+            return view.page_queryset(queryset)
+        if view.paginate_by:
+            queryset = queryset[:view.paginate_by]
+        return queryset
+
+    def _querysets(self, user):
+        yield "IndexView: счетчики главной страницы", counters_sql(user.pk)
+        if user.is_authenticated:
+            yield "RecipientMailingListView", self._view_queryset(views.RecipientMailingListView, user)
+            yield "MailingListView", self._view_queryset(views.MailingListView, user)
+            yield "MailingAttemptListView", self._view_queryset(views.MailingAttemptListView, user)
+        yield "MessageListView", self._view_queryset(views.MessageListView, user)
+
+    @staticmethod
+    def _explain(query):
+        if isinstance(query, tuple):
+            sql, params = query
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) " if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN "
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+        if connection.vendor == "postgresql":
+            return query.explain(analyze=True, buffers=True)
+        return query.explain()
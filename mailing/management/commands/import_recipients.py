@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand, CommandError
+
+from mailing.recipient_import import IMPORT_BATCH_SIZE, import_recipients, read_csv
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Массовая загрузка получателей из CSV-файла (email, fio, comment)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV-файлу")
+        parser.add_argument("--owner", required=True, help="email пользователя-владельца получателей")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Размер пачки вставки")
+        parser.add_argument("--encoding", default="utf-8-sig", help="Кодировка файла")
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(email=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        def progress(result):
+            self.stdout.write(f"\r{result}", ending="")
+            self.stdout.flush()
+
+        try:
+            with open(options["path"], "rb") as file:
+                result = import_recipients(read_csv(file, options["encoding"]), owner, options["batch_size"], progress)
+        except OSError as error:
+            raise CommandError(f"Не удалось прочитать файл: {error}")
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(f"Импорт завершен. {result}"))
@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import platform
+import time
+
+import django
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from mailing import counters, view_cache
+from mailing.models import Mailing, MailingAttempt, Message, RecipientMailing
+from mailing.parallel import send_mailing_parallel
+from mailing.services import batched, finish_mailing_job, mailings_changed, send_mailing, start_mailing_job
+from mailing.smtp_pool import SMTPConnectionPool
+from mailing.smtp_sink import sink_process
+from users.models import User
+
+GENERATE_BATCH_SIZE = 5000
+
+VIEWS = (
+    ("IndexView", "mailing:home"),
+    ("MailingListView", "mailing:mailing_list"),
+    ("MailingAttemptListView", "mailing:attempt"),
+)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу: значение, не превышаемое percent% замеров"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(seconds):
+    """p50/p99/среднее/максимум в миллисекундах"""
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+
+class TimedSMTPConnectionPool(SMTPConnectionPool):
+    """Пул соединений, замеряющий время каждой SMTP-транзакции (сборка MIME и отправка письма)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timings = []
+
+    def _deliver(self, backend, message):
+        started = time.perf_counter()
+        result = super()._deliver(backend, message)
+        self.timings.append(time.perf_counter() - started)
+        return result
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк сервиса на синтетических данных: отправка рассылки на локальный SMTP-сервер-заглушку "
+            "и основные страницы; результат - JSON-отчет для сравнения между версиями")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=1000, help="Количество получателей (1 000 - 1 000 000)")
+        parser.add_argument("--users", type=int, default=10, help="Количество пользователей")
+        parser.add_argument("--mailings", type=int, default=50, help="Количество рассылок для страниц списков")
+        parser.add_argument("--attempts", type=int, default=1000, help="Количество попыток для страницы статистики")
+        parser.add_argument("--requests", type=int, default=50, help="Запросов к каждой странице")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Процессов отправки; больше 1 - send_mailing_parallel без замера задержки писем")
+        parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа сервера на письмо, сек.")
+        parser.add_argument("--output", default="mailing_benchmark.json", help="Файл JSON-отчета")
+        parser.add_argument("--keep", action="store_true", help="Не удалять синтетические данные после замера")
+
+    def handle(self, *args, **options):
+        if options["scale"] < 1 or options["users"] < 1:
+            raise CommandError("--scale и --users должны быть больше нуля")
+        prefix = f"bench{time.time_ns()}"
+        report = {
+            "started_at": timezone.now().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "cpu_count": os.cpu_count(),
+            },
+            "parameters": {key: options[key] for key in
+                           ("scale", "users", "mailings", "attempts", "requests", "workers", "latency")},
+        }
+        try:
+            started = time.perf_counter()
+            owner, mailing = self._generate(prefix, options)
+            report["generate"] = {"seconds": round(time.perf_counter() - started, 3)}
+            self.stdout.write(f"Данные созданы за {report['generate']['seconds']} с")
+
+            report["send"] = self._benchmark_send(owner, mailing, options)
+            self.stdout.write("Отправка: {letters} писем, {messages_per_second} писем/с".format(**report["send"]))
+
+            report["views"] = self._benchmark_views(owner, options["requests"])
+            for name, result in report["views"].items():
+                self.stdout.write(f"{name}: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс, "
+                                  f"запросов к БД {result['queries_cold']} / {result['queries_warm']}")
+        finally:
+            if not options["keep"]:
+                self._cleanup(prefix)
+
+        with open(options["output"], "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Отчет записан в {options['output']}"))
+
+    def _generate(self, prefix, options):
+        """Пользователи, получатели, сообщения, рассылки и попытки; возвращает владельца и рассылку для отправки"""
+        users = User.objects.bulk_create([
+            User(email=f"{prefix}-u{number}@example.com", username=f"{prefix}-u{number}", is_active=True)
+            for number in range(options["users"])
+        ])
+        owner = users[0]
+        messages = Message.objects.bulk_create([
+            Message(theme=f"Тема {number}", content="Здравствуйте, {{ fio }}! Текст синтетического письма.",
+                    owner=user)
+            for number, user in enumerate(users)
+        ])
+
+        recipients = (
+            RecipientMailing(email=f"{prefix}-r{number}@example.com", fio=f"Получатель {number}",
+                             owner=users[number % len(users)])
+            for number in range(options["scale"])
+        )
+        for batch in batched(recipients, GENERATE_BATCH_SIZE):
+            RecipientMailing.objects.bulk_create(batch)
+        recipient_ids = RecipientMailing.objects.filter(email__startswith=f"{prefix}-").values_list("id", flat=True)
+
+        with transaction.atomic():
+            mailing = Mailing.objects.create(message=messages[0], owner=owner)
+            Through = Mailing.recipients.through
+            for batch in batched(recipient_ids.order_by("id").iterator(chunk_size=GENERATE_BATCH_SIZE),
+                                 GENERATE_BATCH_SIZE):
+                Through.objects.bulk_create([Through(mailing_id=mailing.pk, recipientmailing_id=pk) for pk in batch])
+
+            now = timezone.now()
+            statuses = [Mailing.CREATED, Mailing.LAUNCHED, Mailing.COMPLETED]
+            listed = Mailing.objects.bulk_create([
+                Mailing(message=messages[number % len(users)], owner=users[number % len(users)],
+                        status=statuses[number % len(statuses)], first_sending=now)
+                for number in range(options["mailings"])
+            ])
+            sample = list(recipient_ids.order_by("id")[:10])
+            Through.objects.bulk_create([Through(mailing_id=item.pk, recipientmailing_id=pk)
+                                         for item in listed for pk in sample])
+            attempts = (
+                MailingAttempt(mailing=listed[number % len(listed)] if listed else mailing, owner=owner,
+                               status=MailingAttempt.STATUS_OK, server_response="Доставлено: 1")
+                for number in range(options["attempts"])
+            )
+            for batch in batched(attempts, GENERATE_BATCH_SIZE):
+                MailingAttempt.objects.bulk_create(batch)
+
+        # Массовая вставка не вызывает сигналы: сбрасываем кэши вручную
+        counters.invalidate()
+        mailings_changed()
+        view_cache.objects_changed(RecipientMailing)
+        view_cache.objects_changed(MailingAttempt)
+        return owner, mailing
+
+    def _benchmark_send(self, owner, mailing, options):
+        with sink_process(latency=options["latency"]) as port:
+            relay = {"host": "127.0.0.1", "port": port, "username": "", "password": "",
+                     "use_ssl": False, "use_tls": False}
+            with override_settings(EMAIL_BACKEND="mailing.relays.RelayEmailBackend", EMAIL_RELAYS=[relay],
+                                   MAILING_SEND_ENGINE="pool"):
+                pool = None
+                started = time.perf_counter()
+                if options["workers"] > 1:
+                    send_mailing_parallel(mailing, owner, options["workers"])
+                else:
+                    # Как и send_mailing_parallel, отправка идет под заданием, чтобы ее не перехватил воркер
+                    job = start_mailing_job(mailing, owner)
+                    pool = TimedSMTPConnectionPool(size=1)
+                    try:
+                        send_mailing(mailing, owner, pool)
+                    finally:
+                        pool.close()
+                    finish_mailing_job(job)
+                elapsed = time.perf_counter() - started
+
+        letters = mailing.deliveries.count()
+        return {
+            "letters": letters,
+            "seconds": round(elapsed, 3),
+            "messages_per_second": round(letters / elapsed, 1) if elapsed else None,
+            "latency": summarize(pool.timings) if pool is not None and pool.timings else None,
+        }
+
+    @staticmethod
+    def _benchmark_views(owner, requests):
+        client = Client()
+        client.force_login(owner)
+        results = {}
+        for name, url_name in VIEWS:
+            url = reverse(url_name)
+            timings, queries = [], []
+            for _ in range(max(1, requests)):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{name}: ответ {response.status_code}")
+                queries.append(len(captured))
+            results[name] = {
+                **summarize(timings),
+                "requests": len(timings),
+                # Первый запрос - с пустым кэшем, остальные могут попадать в кэш страниц и данных
+                "queries_cold": queries[0],
+                "queries_warm": percentile(queries, 50),
+            }
+        return results
+
+    @staticmethod
+    def _cleanup(prefix):
+        """Удаление синтетических данных этого запуска"""
+        owners = User.objects.filter(email__startswith=f"{prefix}-")
+        Mailing.objects.filter(owner__in=owners).delete()
+        Message.objects.filter(owner__in=owners).delete()
+        RecipientMailing.objects.filter(email__startswith=f"{prefix}-").delete()
+        owners.delete()
+        counters.invalidate()
+        mailings_changed()
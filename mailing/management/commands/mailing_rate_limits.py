@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from mailing.models import Mailing
+from mailing.ratelimit import host_bucket, owner_bucket
+from mailing.relays import get_relays, relay_name
+
+
+class Command(BaseCommand):
+    help = "Заполненность корзин токенов ограничителя скорости отправки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, nargs="*",
+                            help="id владельцев (по умолчанию - владельцы запущенных рассылок)")
+
+    def handle(self, *args, **options):
+        if settings.MAILING_RATE_LIMIT_HOST:
+            for config in get_relays():
+                name = relay_name(config)
+                self._report(f"SMTP-сервер {name}", host_bucket(name))
+        if settings.MAILING_RATE_LIMIT_OWNER:
+            owners = options["owner"]
+            if owners is None:
+                owners = (Mailing.objects.filter(status=Mailing.LAUNCHED, owner__isnull=False)
+                          .values_list("owner", flat=True).distinct())
+            for owner_id in owners:
+                self._report(f"Владелец {owner_id}", owner_bucket(owner_id))
+
+    def _report(self, name, bucket):
+        level = bucket.level()
+        self.stdout.write(f"{name}: {level:.1f} из {bucket.capacity} токенов ({level / bucket.capacity:.0%}), "
+                          f"пополнение {bucket.rate * 60:.0f} в минуту")
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from mailing.models import MailingJob
+from mailing.services import STALE_JOB_TIMEOUT, get_sender, resume_mailings, run_mailing_job
+
+
+class Command(BaseCommand):
+    help = "Возобновление прерванных рассылок с последней зафиксированной пачки"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale", type=float, default=STALE_JOB_TIMEOUT.total_seconds() / 60,
+                            help="Через сколько минут выполняющееся задание считается прерванным")
+        parser.add_argument("--now", action="store_true", help="Отправить сразу, не дожидаясь воркера очереди")
+
+    def handle(self, *args, **options):
+        jobs = resume_mailings(stale_after=timedelta(minutes=options["stale"]))
+        if options["now"] and jobs:
+            sender = get_sender()
+            try:
+                for job in jobs:
+                    # Условный UPDATE: задание, которое уже взял воркер очереди, не выполняем повторно
+                    now = timezone.now()
+                    claimed = MailingJob.objects.filter(pk=job.pk, status=MailingJob.QUEUED).update(
+                        status=MailingJob.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+                    )
+                    if not claimed:
+                        continue
+                    run_mailing_job(job, sender)
+                    self.stdout.write(f"{job}: рассылка {job.mailing_id}")
+            finally:
+                sender.close()
+        self.stdout.write(self.style.SUCCESS(f"Возобновлено рассылок: {len(jobs)}"))
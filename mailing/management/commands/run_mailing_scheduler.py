@@ -0,0 +1,30 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from mailing.services import complete_expired_mailings, launch_due_mailings
+
+
+class Command(BaseCommand):
+    help = "Планировщик: запуск рассылок по first_sending и завершение по end_sending"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=30.0, help="Пауза между проверками, сек.")
+        parser.add_argument("--once", action="store_true", help="Выполнить одну проверку и завершиться")
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Планировщик рассылок запущен"))
+        try:
+            while True:
+                close_old_connections()
+                launched = launch_due_mailings()
+                completed = complete_expired_mailings()
+                if launched or completed:
+                    self.stdout.write(f"Запущено рассылок: {launched}, завершено: {completed}")
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Планировщик рассылок остановлен"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from mailing.relays import get_relay_stats
+from mailing.services import claim_mailing_job, get_sender, run_mailing_job, send_due_retries
+from mailing.smtp_pool import SMTPConnectionPool
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди отправки рассылок"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sleep", type=float, default=2.0, help="Пауза между опросами пустой очереди, сек.")
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь и завершиться")
+        parser.add_argument("--engine", choices=["pool", "async"], help="Транспорт отправки (по умолчанию из настроек)")
+
+    def handle(self, *args, **options):
+        sender = get_sender(options["engine"])
+        self.stdout.write(self.style.SUCCESS("Воркер рассылок запущен"))
+        try:
+            while True:
+                close_old_connections()
+                job = claim_mailing_job()
+                if job is None:
+                    # Свободное от заданий время воркер тратит на наступившие повторы отправки
+                    retried = send_due_retries(sender)
+                    if retried:
+                        self.stdout.write(f"Повторная отправка писем: {retried}")
+                        continue
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+                run_mailing_job(job, sender)
+                self.stdout.write(f"{job}: рассылка {job.mailing_id}")
+        except KeyboardInterrupt:
+            pass
+        sender.close()
+        if isinstance(sender, SMTPConnectionPool):
+            self.stdout.write("SMTP-соединений открыто: {opened}, переиспользовано: {reused}".format(**sender.stats))
+        for stats in get_relay_stats():
+            self.stdout.write("SMTP-сервер {relay} ({state}): отправлено {sent}, ошибок {failed}, "
+                              "средняя задержка {latency_ms} мс".format(**stats))
+        self.stdout.write(self.style.SUCCESS("Воркер рассылок остановлен"))
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand, CommandError
+
+from mailing.async_sender import AsyncSendingEngine
+from mailing.models import Mailing
+from mailing.services import get_sender, run_mailing_job, start_mailing_job
+
+
+class Command(BaseCommand):
+    help = "Немедленная отправка рассылки без очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument("mailing_id", type=int)
+        parser.add_argument("--engine", choices=["pool", "async"], help="Транспорт отправки (по умолчанию из настроек)")
+        parser.add_argument("--connections", type=int, help="Количество SMTP-соединений асинхронного движка")
+        parser.add_argument("--concurrency", type=int, help="Максимум одновременных SMTP-транзакций")
+
+    def handle(self, *args, **options):
+        try:
+            mailing = Mailing.objects.select_related("message", "owner").get(pk=options["mailing_id"])
+        except Mailing.DoesNotExist:
+            raise CommandError(f"Рассылка {options['mailing_id']} не найдена")
+
+        # Задание "Выполняется" не даст resume_mailings и воркеру отправить рассылку параллельно с командой
+        job = start_mailing_job(mailing, mailing.owner)
+        if job is None:
+            raise CommandError(f"Рассылка {mailing.pk} уже отправляется")
+        if options["engine"] == "async" and (options["connections"] or options["concurrency"]):
+            sender = AsyncSendingEngine(connections=options["connections"], concurrency=options["concurrency"])
+        else:
+            sender = get_sender(options["engine"])
+        try:
+            run_mailing_job(job, sender)
+        finally:
+            sender.close()
+        attempt = mailing.mailing.order_by("-date_attempt").first()
+        self.stdout.write(self.style.SUCCESS(f"{mailing}: {attempt.server_response}"))
@@ -0,0 +1,38 @@
+import os
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from mailing.models import Mailing, MailingDelivery
+from mailing.parallel import merge_statuses, send_mailing_parallel
+
+
+class Command(BaseCommand):
+    help = "Отправка большой рассылки несколькими процессами, каждый отправляет свою часть получателей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("mailing_id", type=int)
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Количество процессов отправки")
+        parser.add_argument("--engine", choices=["pool", "async"], help="Транспорт отправки (по умолчанию из настроек)")
+
+    def handle(self, *args, **options):
+        try:
+            mailing = Mailing.objects.select_related("message", "owner").get(pk=options["mailing_id"])
+        except Mailing.DoesNotExist:
+            raise CommandError(f"Рассылка {options['mailing_id']} не найдена")
+
+        started = time.monotonic()
+        results = send_mailing_parallel(mailing, mailing.owner, options["workers"], options["engine"])
+        elapsed = time.monotonic() - started
+        if results is None:
+            raise CommandError(f"Рассылка {mailing.pk} уже отправляется")
+        for result in results:
+            self.stdout.write(str(result))
+        statuses = merge_statuses(results)
+        letters = sum(statuses.values())
+        self.stdout.write(f"Процессов: {options['workers']}, писем: {letters}, "
+                          f"доставлено: {statuses[MailingDelivery.STATUS_OK]}, за {elapsed:.2f} с "
+                          f"({letters / elapsed if elapsed else 0:.0f} писем/с)")
+        attempt = mailing.mailing.order_by("-date_attempt").first()
+        if attempt is not None:
+            self.stdout.write(self.style.SUCCESS(f"{mailing}: {attempt.server_response}"))
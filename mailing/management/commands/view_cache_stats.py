@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from mailing import urls  # noqa: F401 - регистрирует кэшируемые представления
+from mailing.view_cache import CACHED_VIEWS, get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Попадания и промахи кэша страниц по представлениям"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить статистику после вывода")
+
+    def handle(self, *args, **options):
+        stats = get_stats(CACHED_VIEWS)
+        self.stdout.write(f"{'Представление':<26}{'Попадания':>12}{'Промахи':>12}{'Доля попаданий':>16}")
+        for name, counts in stats.items():
+            total = counts["hit"] + counts["miss"]
+            rate = f"{counts['hit'] / total:.1%}" if total else "-"
+            self.stdout.write(f"{name:<26}{counts['hit']:>12}{counts['miss']:>12}{rate:>16}")
+        if options["reset"]:
+            reset_stats(CACHED_VIEWS)
+            self.stdout.write(self.style.SUCCESS("Статистика обнулена"))
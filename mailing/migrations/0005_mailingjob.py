@@ -0,0 +1,86 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0004_alter_mailing_end_sending_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailingJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("В очереди", "В очереди"),
+                            ("Выполняется", "Выполняется"),
+                            ("Выполнено", "Выполнено"),
+                            ("Ошибка", "Ошибка"),
+                        ],
+                        default="В очереди",
+                        max_length=15,
+                        verbose_name="Статус задания",
+                    ),
+                ),
+                (
+                    "run_after",
+                    models.DateTimeField(default=django.utils.timezone.now, verbose_name="Выполнить не раньше"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата и время постановки в очередь"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Дата и время начала выполнения"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Дата и время окончания выполнения"),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0, verbose_name="Количество запусков")),
+                ("error", models.TextField(blank=True, null=True, verbose_name="Ошибка")),
+                (
+                    "mailing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="mailing.mailing",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задание отправки",
+                "verbose_name_plural": "Задания отправки",
+                "ordering": ["run_after", "id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "В очереди")),
+                        fields=["run_after", "id"],
+                        name="mailing_job_queued_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0005_mailingjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailingDelivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("email", models.EmailField(max_length=150, verbose_name="Почта")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("Доставлено", "Доставлено"), ("Не доставлено", "Не доставлено")],
+                        max_length=15,
+                        verbose_name="Статус доставки",
+                    ),
+                ),
+                ("smtp_code", models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Код ответа SMTP")),
+                (
+                    "server_response",
+                    models.TextField(blank=True, max_length=150, null=True, verbose_name="Ответ почтового сервера"),
+                ),
+                ("date_delivery", models.DateTimeField(auto_now_add=True, verbose_name="Дата и время доставки")),
+                (
+                    "mailing",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deliveries",
+                        to="mailing.mailing",
+                        verbose_name="Рассылка",
+                    ),
+                ),
+                (
+                    "recipient",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="deliveries",
+                        to="mailing.recipientmailing",
+                        verbose_name="Получатель",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Доставка",
+                "verbose_name_plural": "Доставки",
+                "ordering": ["date_delivery", "id"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "Не доставлено")),
+                        fields=["mailing"],
+                        include=("email", "smtp_code"),
+                        name="mailing_delivery_failed_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(fields=("mailing", "email"), name="mailing_delivery_unique_email")
+                ],
+            },
+        ),
+    ]
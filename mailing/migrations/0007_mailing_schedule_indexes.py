@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0006_mailingdelivery"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                condition=models.Q(("status", "Создана")), fields=["first_sending"], name="mailing_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                condition=models.Q(("status__in", ["Создана", "Запущена"])),
+                fields=["end_sending"],
+                name="mailing_expiring_idx",
+            ),
+        ),
+    ]
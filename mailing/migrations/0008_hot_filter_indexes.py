@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0007_mailing_schedule_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(fields=["owner", "status"], name="mailing_owner_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(fields=["owner", "first_sending"], name="mailing_owner_first_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="mailing",
+            index=models.Index(
+                condition=models.Q(("status", "Запущена")), fields=["owner"], name="mailing_launched_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(fields=["owner", "date_attempt", "status"], name="attempt_owner_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipientmailing",
+            index=models.Index(fields=["owner", "fio"], name="recipient_owner_fio_idx"),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0008_hot_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="mailingattempt",
+            name="attempt_owner_date_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="recipientmailing",
+            name="recipient_owner_fio_idx",
+        ),
+        migrations.AddIndex(
+            model_name="mailingattempt",
+            index=models.Index(fields=["owner", "date_attempt", "status", "id"], name="attempt_owner_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipientmailing",
+            index=models.Index(fields=["owner", "fio", "id"], name="recipient_owner_fio_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipientmailing",
+            index=models.Index(fields=["fio", "id"], name="recipient_fio_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0009_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="attachment",
+            field=models.FileField(blank=True, null=True, upload_to="mailing/attachments", verbose_name="Вложение"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0010_message_attachment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="html_content",
+            field=models.TextField(blank=True, null=True, verbose_name="HTML-содержание сообщения"),
+        ),
+    ]
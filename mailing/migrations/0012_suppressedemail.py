@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0011_message_html_content"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SuppressedEmail",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("email", models.EmailField(max_length=150, unique=True, verbose_name="Почта")),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("Ошибка доставки", "Постоянная ошибка доставки"),
+                            ("Отписка", "Отписка"),
+                            ("Жалоба", "Жалоба на спам"),
+                            ("Вручную", "Добавлен вручную"),
+                        ],
+                        default="Вручную",
+                        max_length=20,
+                        verbose_name="Причина",
+                    ),
+                ),
+                ("comment", models.TextField(blank=True, max_length=255, null=True, verbose_name="Комментарий")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата и время добавления")),
+            ],
+            options={
+                "verbose_name": "Заблокированный адрес",
+                "verbose_name_plural": "Заблокированные адреса",
+                "ordering": ["id"],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0012_suppressedemail"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mailingdelivery",
+            name="date_delivery",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Дата и время доставки"),
+        ),
+        migrations.AlterField(
+            model_name="mailingdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Ожидает", "Ожидает отправки"),
+                    ("Доставлено", "Доставлено"),
+                    ("Не доставлено", "Не доставлено"),
+                    ("Пропущено", "Пропущено"),
+                ],
+                default="Ожидает",
+                max_length=15,
+                verbose_name="Статус доставки",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingdelivery",
+            index=models.Index(
+                condition=models.Q(("status", "Ожидает")),
+                fields=["mailing", "id"],
+                name="mailing_delivery_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0013_resumable_deliveries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailingdelivery",
+            name="next_retry_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Следующая попытка"),
+        ),
+        migrations.AddField(
+            model_name="mailingdelivery",
+            name="retries",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="Количество повторов"),
+        ),
+        migrations.AlterField(
+            model_name="mailingdelivery",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Ожидает", "Ожидает отправки"),
+                    ("Доставлено", "Доставлено"),
+                    ("Не доставлено", "Не доставлено"),
+                    ("Пропущено", "Пропущено"),
+                    ("Повтор", "Ожидает повтора"),
+                ],
+                default="Ожидает",
+                max_length=15,
+                verbose_name="Статус доставки",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mailingdelivery",
+            index=models.Index(
+                condition=models.Q(("status", "Повтор")),
+                fields=["next_retry_at", "id"],
+                name="mailing_delivery_retry_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailing", "0014_delivery_retries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailingjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Последняя контрольная точка"),
+        ),
+    ]
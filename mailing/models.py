@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
 
@@ -19,12 +20,19 @@ class RecipientMailing(models.Model):
         verbose_name = "Получатель рассылки"
         verbose_name_plural = "Получатели рассылки"
         ordering = ["fio"]
+        indexes = [
+            # Список получателей отсортирован по Ф.И.О., id - уникальный разделитель для постраничного вывода
+            models.Index(fields=["owner", "fio", "id"], name="recipient_owner_fio_idx"),
+            models.Index(fields=["fio", "id"], name="recipient_fio_idx"),
+        ]
 
 
 class Message(models.Model):
     """Модель создания Сообщения"""
     theme = models.CharField(max_length=255, verbose_name="Тема сообщения")
     content = models.TextField(max_length=800, verbose_name="Содержание сообщения")
+    html_content = models.TextField(blank=True, null=True, verbose_name="HTML-содержание сообщения")
+    attachment = models.FileField(upload_to="mailing/attachments", blank=True, null=True, verbose_name="Вложение")
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Владелец")
 
     def __str__(self):
@@ -72,6 +80,16 @@ class Mailing(models.Model):
         verbose_name = "Рассылка"
         verbose_name_plural = "Рассылки"
         ordering = ["first_sending"]
+        indexes = [
+            # Планировщик: рассылки, ожидающие первой отправки, и рассылки с истекающим окном
+            models.Index(fields=["first_sending"], condition=models.Q(status="Создана"), name="mailing_due_idx"),
+            models.Index(fields=["end_sending"], condition=models.Q(status__in=["Создана", "Запущена"]),
+                         name="mailing_expiring_idx"),
+            # Счетчики главной страницы и список рассылок пользователя
+            models.Index(fields=["owner", "status"], name="mailing_owner_status_idx"),
+            models.Index(fields=["owner", "first_sending"], name="mailing_owner_first_idx"),
+            models.Index(fields=["owner"], condition=models.Q(status="Запущена"), name="mailing_launched_idx"),
+        ]
 
 
 class MailingAttempt(models.Model):
@@ -102,3 +120,134 @@ class MailingAttempt(models.Model):
         verbose_name = "Попытка"
         verbose_name_plural = "Попытки"
         ordering = ["date_attempt", "status"]
+        indexes = [
+            # Статистика пользователя в порядке сортировки модели
+            models.Index(fields=["owner", "date_attempt", "status", "id"], name="attempt_owner_date_idx"),
+        ]
+
+
+class MailingJob(models.Model):
+    """Модель задания очереди отправки рассылок"""
+
+    QUEUED = "В очереди"
+    RUNNING = "Выполняется"
+    DONE = "Выполнено"
+    FAILED = "Ошибка"
+
+    STATUS_CHOICES = [
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Выполнено"),
+        (FAILED, "Ошибка"),
+    ]
+
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name="Рассылка", related_name="jobs")
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=QUEUED, verbose_name="Статус задания")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Выполнить не раньше")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время постановки в очередь")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Дата и время начала выполнения")
+    heartbeat_at = models.DateTimeField(blank=True, null=True, verbose_name="Последняя контрольная точка")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Дата и время окончания выполнения")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Количество запусков")
+    error = models.TextField(blank=True, null=True, verbose_name="Ошибка")
+    owner = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="Владелец")
+
+    def __str__(self):
+        return f"Задание {self.id} <{self.status}>"
+
+    class Meta:
+        verbose_name = "Задание отправки"
+        verbose_name_plural = "Задания отправки"
+        ordering = ["run_after", "id"]
+        indexes = [
+            # Воркеры выбирают только задания в очереди, поэтому индекс частичный
+            models.Index(fields=["run_after", "id"], condition=models.Q(status="В очереди"),
+                         name="mailing_job_queued_idx"),
+        ]
+
+
+class MailingDelivery(models.Model):
+    """Модель доставки рассылки одному получателю"""
+
+    STATUS_PENDING = "Ожидает"
+    STATUS_OK = "Доставлено"
+    STATUS_NOK = "Не доставлено"
+    STATUS_SKIPPED = "Пропущено"
+    STATUS_RETRY = "Повтор"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Ожидает отправки"),
+        (STATUS_OK, "Доставлено"),
+        (STATUS_NOK, "Не доставлено"),
+        (STATUS_SKIPPED, "Пропущено"),
+        (STATUS_RETRY, "Ожидает повтора"),
+    ]
+
+    mailing = models.ForeignKey(Mailing, on_delete=models.CASCADE, verbose_name="Рассылка",
+                                related_name="deliveries")
+    recipient = models.ForeignKey(RecipientMailing, on_delete=models.SET_NULL, blank=True, null=True,
+                                  verbose_name="Получатель", related_name="deliveries")
+    email = models.EmailField(max_length=150, verbose_name="Почта")
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default=STATUS_PENDING,
+                              verbose_name="Статус доставки")
+    smtp_code = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Код ответа SMTP")
+    server_response = models.TextField(max_length=150, blank=True, null=True, verbose_name="Ответ почтового сервера")
+    date_delivery = models.DateTimeField(blank=True, null=True, verbose_name="Дата и время доставки")
+    retries = models.PositiveSmallIntegerField(default=0, verbose_name="Количество повторов")
+    next_retry_at = models.DateTimeField(blank=True, null=True, verbose_name="Следующая попытка")
+
+    def __str__(self):
+        return f"{self.email} <{self.status}>"
+
+    class Meta:
+        verbose_name = "Доставка"
+        verbose_name_plural = "Доставки"
+        ordering = ["date_delivery", "id"]
+        indexes = [
+            # "Недоставленные письма рассылки X" читаются только из индекса (index-only scan)
+            models.Index(fields=["mailing"], include=["email", "smtp_code"],
+                         condition=models.Q(status="Не доставлено"), name="mailing_delivery_failed_idx"),
+            # Продолжение отправки читает только ожидающие доставки рассылки по порядку id
+            models.Index(fields=["mailing", "id"], condition=models.Q(status="Ожидает"),
+                         name="mailing_delivery_pending_idx"),
+            # Воркер выбирает наступившие повторы одним запросом по этому индексу
+            models.Index(fields=["next_retry_at", "id"], condition=models.Q(status="Повтор"),
+                         name="mailing_delivery_retry_idx"),
+        ]
+        constraints = [
+            # Снимок аудитории: не больше одного письма на адрес в рамках рассылки
+            models.UniqueConstraint(fields=["mailing", "email"], name="mailing_delivery_unique_email"),
+        ]
+
+
+class SuppressedEmail(models.Model):
+    """Модель адреса, на который рассылки не отправляются (отписка, постоянная ошибка доставки)"""
+
+    BOUNCE = "Ошибка доставки"
+    UNSUBSCRIBE = "Отписка"
+    COMPLAINT = "Жалоба"
+    MANUAL = "Вручную"
+
+    REASON_CHOICES = [
+        (BOUNCE, "Постоянная ошибка доставки"),
+        (UNSUBSCRIBE, "Отписка"),
+        (COMPLAINT, "Жалоба на спам"),
+        (MANUAL, "Добавлен вручную"),
+    ]
+
+    email = models.EmailField(max_length=150, unique=True, verbose_name="Почта")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default=MANUAL, verbose_name="Причина")
+    comment = models.TextField(max_length=255, blank=True, null=True, verbose_name="Комментарий")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата и время добавления")
+
+    def save(self, *args, **kwargs):
+        self.email = self.email.strip().lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.email} <{self.reason}>"
+
+    class Meta:
+        verbose_name = "Заблокированный адрес"
+        verbose_name_plural = "Заблокированные адреса"
+        ordering = ["id"]
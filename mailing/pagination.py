@@ -0,0 +1,93 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+PAGE_SIZE = 20
+
+
+class KeysetPaginationMixin:
+    """Миксин для ListView: постраничный вывод по ключу (seek) вместо OFFSET.
+
+    Страница начинается сразу после ключа последней строки предыдущей страницы, поэтому глубокие
+    страницы стоят столько же, сколько первая. Ключ - поля Meta.ordering модели плюс pk
+    как уникальный разделитель одинаковых значений; поля сортировки не должны быть NULL.
+    Курсоры next/previous передаются в GET-параметре cursor в виде непрозрачной строки.
+    """
+
+    page_size = PAGE_SIZE
+    cursor_param = "cursor"
+
+    def get_keyset_ordering(self):
+        """Поля ключа: (имя поля, по убыванию)"""
+        ordering = [(name.lstrip("-"), name.startswith("-")) for name in self.model._meta.ordering]
+        return ordering + [(self.model._meta.pk.name, False)]
+
+    def get_context_data(self, **kwargs):
+        page, previous_cursor, next_cursor = self.paginate_keyset(self.object_list)
+        context = super().get_context_data(object_list=page, **kwargs)
+        context["previous_cursor"] = previous_cursor
+        context["next_cursor"] = next_cursor
+        return context
+
+    def page_queryset(self, queryset, direction="next", key=None):
+        """Запрос строк страницы после ключа (без ключа - первой), лишняя строка - признак следующей страницы"""
+        ordering = self.get_keyset_ordering()
+        backwards = direction == "previous"
+        if key is not None:
+            queryset = queryset.filter(self._seek(ordering, key, backwards))
+        order_by = [f"{'-' if descending != backwards else ''}{name}" for name, descending in ordering]
+        return queryset.order_by(*order_by)[:self.page_size + 1]
+
+    def paginate_keyset(self, queryset):
+        """Строки страницы и курсоры соседних страниц"""
+        ordering = self.get_keyset_ordering()
+        direction, key = self.decode_cursor(self.request.GET.get(self.cursor_param), ordering)
+        backwards = direction == "previous"
+        rows = list(self.page_queryset(queryset, direction, key))
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return rows, None, None
+
+        has_previous = has_more if backwards else key is not None
+        has_next = key is not None if backwards else has_more
+        previous_cursor = self.encode_cursor("previous", rows[0], ordering) if has_previous else None
+        next_cursor = self.encode_cursor("next", rows[-1], ordering) if has_next else None
+        return rows, previous_cursor, next_cursor
+
+    @staticmethod
+    def _seek(ordering, key, backwards):
+        """Условие "строго после ключа" в виде a >= x AND (a > x OR (a = x AND ...)),
+        ведущее сравнение позволяет БД начать чтение индекса прямо с нужного места"""
+        condition = None
+        for (name, descending), value in reversed(list(zip(ordering, key))):
+            lookup = "lt" if descending != backwards else "gt"
+            strict = Q(**{f"{name}__{lookup}": value})
+            condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+        name, descending = ordering[0]
+        return Q(**{f"{name}__{'lte' if descending != backwards else 'gte'}": key[0]}) & condition
+
+    def encode_cursor(self, direction, row, ordering):
+        key = [getattr(row, self.model._meta.get_field(name).attname) for name, _ in ordering]
+        payload = json.dumps([direction, key], cls=DjangoJSONEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor, ordering):
+        """Направление и ключ из курсора; без курсора - первая страница"""
+        if not cursor:
+            return "next", None
+        try:
+            direction, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            fields = [self.model._meta.get_field(name) for name, _ in ordering]
+            if direction not in ("next", "previous") or len(key) != len(fields):
+                raise ValueError
+            return direction, [field.to_python(value) for field, value in zip(fields, key)]
+        except (ValueError, TypeError, binascii.Error, ValidationError) as error:
+            raise Http404("Некорректный курсор страницы") from error
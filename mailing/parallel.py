@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.db import connections
+from django.db.models import Max, Min
+
+from mailing import services, smtp_pool
+from mailing.attachments import get_attachment_part
+from mailing.models import Mailing, MailingDelivery
+from mailing.personalization import compile_message
+
+# Частей больше, чем процессов: процесс, закончивший свою часть раньше, берет следующую
+SHARDS_PER_WORKER = 4
+
+
+class ShardResult:
+    """Итоги отправки одной части рассылки"""
+
+    def __init__(self, first_id, last_id, statuses, seconds):
+        self.first_id = first_id
+        self.last_id = last_id
+        self.statuses = statuses
+        self.seconds = seconds
+
+    @property
+    def letters(self):
+        return sum(self.statuses.values())
+
+    def __str__(self):
+        return (f"Доставки {self.first_id}-{self.last_id}: писем {self.letters}, "
+                f"доставлено {self.statuses[MailingDelivery.STATUS_OK]}, за {self.seconds:.2f} с")
+
+
+def split_ranges(first_id, last_id, parts):
+    """Разбиение диапазона id [first_id, last_id] на непересекающиеся диапазоны примерно равной длины"""
+    size = last_id - first_id + 1
+    parts = max(1, min(parts, size))
+    step, rest = divmod(size, parts)
+    ranges = []
+    start = first_id
+    for index in range(parts):
+        end = start + step - 1 + (1 if index < rest else 0)
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def _init_worker():
+    """Процесс пула открывает свои соединения с SMTP, а не использует унаследованные от родителя"""
+    smtp_pool._pool = None
+    services._async_engine = None
+
+
+def send_shard(mailing_id, first_id, last_id, engine=None):
+    """Отправка части рассылки в процессе пула: ожидающие доставки с id из [first_id, last_id]"""
+    started = time.monotonic()
+    mailing = Mailing.objects.get(pk=mailing_id)
+    message = services.get_message(mailing.message_id)
+    sender = services.get_sender(engine)
+    try:
+        statuses = services.send_pending(mailing, compile_message(message), get_attachment_part(message), sender,
+                                         first_id, last_id)
+    finally:
+        sender.close()
+    return ShardResult(first_id, last_id, statuses, time.monotonic() - started)
+
+
+def send_mailing_parallel(mailing, user=None, workers=None, engine=None):
+    """Отправка большой рассылки несколькими процессами, возвращает итоги по частям.
+
+    Ожидающие доставки снимка аудитории делятся на непересекающиеся диапазоны id, каждый диапазон
+    отправляет процесс пула со своими соединениями с БД и SMTP - сборка писем не упирается в GIL
+    одного процесса. Итог рассылки считается по всем доставкам после завершения всех частей.
+    На время отправки рассылка закреплена за заданием "Выполняется" (None - ее уже отправляет
+    другой процесс). Если часть упала, задание завершается с ошибкой, а неотправленные доставки
+    остаются "Ожидает" и продолжаются resume_mailings.
+    Вызывать вне транзакции: перед запуском процессов соединения с БД закрываются.
+    """
+    workers = workers or os.cpu_count()
+    job = services.start_mailing_job(mailing, user)
+    if job is None:
+        return None
+    if not services.start_mailing(mailing):
+        services.finish_mailing_job(job)
+        return []
+    bounds = MailingDelivery.objects.filter(mailing=mailing, status=MailingDelivery.STATUS_PENDING).aggregate(
+        first=Min("id"), last=Max("id")
+    )
+    results = []
+    if bounds["first"] is not None:
+        ranges = split_ranges(bounds["first"], bounds["last"], workers * SHARDS_PER_WORKER)
+        # Дочерние процессы не должны унаследовать открытые соединения с БД: каждый откроет свое
+        connections.close_all()
+        errors = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=_init_worker,
+                                 mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(send_shard, mailing.pk, first, last, engine) for first, last in ranges]
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as error:  # ошибка одной части не должна прерывать остальные
+                    errors.append(error)
+        if errors:
+            services.finish_mailing_job(job, str(errors[0]) or errors[0].__class__.__name__)
+            raise errors[0]
+    services.finish_mailing(mailing, user)
+    services.finish_mailing_job(job)
+    return sorted(results, key=lambda result: result.first_id)
+
+
+def merge_statuses(results):
+    """Суммарные статусы доставок по всем частям"""
+    return sum((result.statuses for result in results), Counter())
@@ -0,0 +1,82 @@
+import hashlib
+import re
+
+from mailing.email_html import escape_values, html_to_text, render_html_skeleton
+from mailing.lru_cache import LRUCache
+
+MERGE_FIELDS = ("fio", "email", "comment")
+FIELD_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+_compiled = LRUCache(maxsize=256, ttl=60 * 60)
+
+
+class CompiledTemplate:
+    """Шаблон с полями подстановки {{ fio }}, {{ email }}, {{ comment }}, разобранный один раз.
+
+    Текст превращается в строку формата str.format_map, поэтому подстановка для каждого получателя -
+    один проход на C без разбора шаблона. Неизвестные поля остаются в тексте как есть.
+    """
+
+    def __init__(self, text):
+        self.fields = []
+        parts = []
+        position = 0
+        for match in FIELD_RE.finditer(text):
+            name = match.group(1)
+            if name not in MERGE_FIELDS:
+                continue
+            parts.append(_escape(text[position:match.start()]))
+            parts.append(f"{{{name}}}")
+            if name not in self.fields:
+                self.fields.append(name)
+            position = match.end()
+        parts.append(_escape(text[position:]))
+        self.text = text
+        self.format = "".join(parts)
+
+    def render(self, values):
+        """Текст для одного получателя, values - словарь значений полей подстановки"""
+        if not self.fields:
+            return self.text
+        return self.format.format_map(values)
+
+
+def _escape(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class CompiledMessage:
+    """Тема, текст и HTML сообщения, скомпилированные для персональной подстановки.
+
+    HTML собирается из оформления и содержимого, стили встраиваются, а текстовая альтернатива
+    строится из HTML - все это один раз на сообщение; для получателя остается подстановка полей.
+    """
+
+    def __init__(self, message):
+        self.theme = CompiledTemplate(message.theme)
+        self.html = None
+        if message.html_content:
+            skeleton = render_html_skeleton(message)
+            self.html = CompiledTemplate(skeleton)
+            self.content = CompiledTemplate(html_to_text(skeleton))
+        else:
+            self.content = CompiledTemplate(message.content)
+        templates = [self.theme, self.content] + ([self.html] if self.html else [])
+        self.fields = list(dict.fromkeys(name for template in templates for name in template.fields))
+
+    def render(self, recipient):
+        """Тема, текст и HTML (или None) письма для получателя"""
+        values = {name: getattr(recipient, name) or "" for name in self.fields}
+        html = self.html.render(escape_values(values)) if self.html else None
+        return self.theme.render(values), self.content.render(values), html
+
+
+def compile_message(message):
+    """Скомпилированное сообщение из кэша по id и хэшу содержимого: правка текста дает новый ключ"""
+    source = "\0".join([message.theme, message.content, message.html_content or ""])
+    key = f"{message.pk}:{hashlib.sha1(source.encode()).hexdigest()}"
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = CompiledMessage(message)
+        _compiled.set(key, compiled)
+    return compiled
@@ -0,0 +1,110 @@
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 5
+# Пауза между попытками взять блокировку растет от LOCK_MIN_DELAY до LOCK_MAX_DELAY секунд
+LOCK_MIN_DELAY = 0.001
+LOCK_MAX_DELAY = 0.05
+# Запас времени жизни состояния корзины сверх времени ее полного пополнения, сек.
+BUCKET_TTL_MARGIN = 60
+
+
+@contextmanager
+def cache_lock(key, timeout=LOCK_TIMEOUT):
+    """Короткая межпроцессная блокировка на cache.add (атомарна в Redis и локальном кэше).
+
+    Ожидание с экспоненциально растущей паузой и случайным разбросом, чтобы ожидающие процессы
+    не опрашивали кэш каждую миллисекунду и не просыпались одновременно.
+    """
+    lock_key = f"{key}:lock"
+    delay = LOCK_MIN_DELAY
+    while not cache.add(lock_key, 1, timeout):
+        time.sleep(random.uniform(0, delay))
+        delay = min(delay * 2, LOCK_MAX_DELAY)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+class TokenBucket:
+    """Корзина токенов, состояние которой хранится в кэше Django и общее для всех процессов-воркеров.
+
+    Общей корзина бывает только с общим кэшем (CACHE_ENABLE): с локальным кэшем процесса у каждого
+    воркера своя корзина, об этом предупреждает проверка mailing.W001 (mailing/checks.py).
+
+    Токены резервируются заранее: баланс может уйти в минус, а вызывающий получает время ожидания,
+    поэтому ожидающие отправители выстраиваются в очередь, а не перезапрашивают токены в цикле.
+    """
+
+    def __init__(self, key, per_minute, burst=None):
+        self.key = f"ratelimit:{key}"
+        self.rate = per_minute / 60
+        self.capacity = burst or settings.MAILING_RATE_LIMIT_BURST
+
+    def _refill(self, now):
+        tokens, updated = cache.get(self.key) or (self.capacity, now)
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def reserve(self, tokens=1):
+        """Резервирование токенов, возвращает сколько секунд нужно подождать до их появления"""
+        with cache_lock(self.key):
+            now = time.time()
+            available = self._refill(now) - tokens
+            # Состояние хранится, пока корзина не пополнится полностью: раньше истекший ключ обнулил бы долг
+            cache.set(self.key, (available, now), int((self.capacity - available) / self.rate) + BUCKET_TTL_MARGIN)
+        return 0.0 if available >= 0 else -available / self.rate
+
+    def level(self):
+        """Текущее количество токенов в корзине (отрицательное - есть очередь ожидающих)"""
+        return self._refill(time.time())
+
+
+class RateLimiter:
+    """Набор корзин токенов, все они должны разрешить отправку"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def reserve(self, tokens=1):
+        """Резервирование во всех корзинах, возвращает время ожидания"""
+        return max(bucket.reserve(tokens) for bucket in self.buckets)
+
+    def acquire(self, tokens=1):
+        """Ожидание токенов вместо отказа в отправке"""
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+
+def host_bucket(host):
+    """Корзина SMTP-сервера (реле) по адресу host:port"""
+    return TokenBucket(f"host:{host}", settings.MAILING_RATE_LIMIT_HOST)
+
+
+def host_limiter(host):
+    """Ограничитель скорости SMTP-сервера, None если лимит не задан.
+
+    Применяется после выбора реле для письма (RelayEmailBackend, AsyncSendingEngine), поэтому
+    у каждого реле своя корзина.
+    """
+    return RateLimiter([host_bucket(host)]) if settings.MAILING_RATE_LIMIT_HOST else None
+
+
+def owner_bucket(owner_id):
+    """Корзина владельца рассылки"""
+    return TokenBucket(f"owner:{owner_id}", settings.MAILING_RATE_LIMIT_OWNER)
+
+
+def get_rate_limiter(owner_id=None):
+    """Ограничитель скорости для рассылки владельца, None если лимит не задан в настройках.
+
+    Лимит SMTP-сервера сюда не входит: он зависит от реле, выбранного для каждого письма (host_limiter).
+    """
+    if settings.MAILING_RATE_LIMIT_OWNER and owner_id is not None:
+        return RateLimiter([owner_bucket(owner_id)])
+    return None
@@ -0,0 +1,129 @@
+import csv
+import io
+from itertools import chain
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from mailing import counters, view_cache
+from mailing.models import RecipientMailing
+from mailing.services import batched
+
+IMPORT_BATCH_SIZE = 1000
+
+EMAIL_COLUMNS = ("email", "e-mail", "почта")
+FIO_COLUMNS = ("fio", "ф.и.о.", "фио", "name")
+COMMENT_COLUMNS = ("comment", "комментарий")
+
+EMAIL_MAX_LENGTH = RecipientMailing._meta.get_field("email").max_length
+FIO_MAX_LENGTH = RecipientMailing._meta.get_field("fio").max_length
+COMMENT_MAX_LENGTH = RecipientMailing._meta.get_field("comment").max_length
+
+
+class ImportResult:
+    """Итоги импорта получателей"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def __str__(self):
+        return (f"Строк: {self.rows}, добавлено: {self.created}, уже есть в базе: {self.duplicates}, "
+                f"с ошибкой в адресе: {self.invalid}")
+
+
+def normalize_email(value):
+    """Адрес без пробелов в нижнем регистре или None, если адрес некорректен"""
+    email = (value or "").strip().lower()
+    if not email or len(email) > EMAIL_MAX_LENGTH:
+        return None
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    return email
+
+
+def _column(header, names, default=None):
+    for index, title in enumerate(header):
+        if title.strip().lower() in names:
+            return index
+    return default
+
+
+def read_csv(binary_file, encoding="utf-8-sig"):
+    """Потоковое чтение CSV: генератор (email, fio, comment) без загрузки файла в память.
+
+    Разделитель (запятая, точка с запятой или табуляция) определяется по первой строке.
+    Если первая строка не заголовок, колонки считаются в порядке email, fio, comment.
+    """
+    text = io.TextIOWrapper(binary_file, encoding=encoding, errors="replace", newline="")
+    first_line = text.readline()
+    if not first_line:
+        return
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(chain([first_line], text), dialect)
+
+    header = next(reader)
+    email_index = _column(header, EMAIL_COLUMNS)
+    if email_index is None:
+        # Заголовка нет: первая строка - уже данные
+        email_index, fio_index, comment_index = 0, 1, 2
+        reader = chain([header], reader)
+    else:
+        fio_index = _column(header, FIO_COLUMNS)
+        comment_index = _column(header, COMMENT_COLUMNS)
+
+    for row in reader:
+        if not any(row):
+            continue
+        yield (
+            row[email_index] if email_index < len(row) else "",
+            row[fio_index] if fio_index is not None and fio_index < len(row) else "",
+            row[comment_index] if comment_index is not None and comment_index < len(row) else "",
+        )
+
+
+def import_recipients(rows, owner, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Импорт получателей пачками bulk_create(ignore_conflicts=True), владелец - загрузивший пользователь.
+
+    В памяти одновременно только одна пачка строк; progress(result) вызывается после каждой пачки.
+    """
+    result = ImportResult()
+    for batch in batched(rows, batch_size):
+        result.rows += len(batch)
+        recipients = {}
+        for email, fio, comment in batch:
+            email = normalize_email(email)
+            if email is None:
+                result.invalid += 1
+                continue
+            if email in recipients:
+                result.duplicates += 1
+                continue
+            recipients[email] = RecipientMailing(
+                email=email,
+                fio=(fio.strip() or email.split("@")[0])[:FIO_MAX_LENGTH],
+                comment=comment.strip()[:COMMENT_MAX_LENGTH] or None,
+                owner=owner,
+            )
+
+        existing = set(RecipientMailing.objects.filter(email__in=recipients).values_list("email", flat=True))
+        new = [recipient for email, recipient in recipients.items() if email not in existing]
+        # ignore_conflicts страхует от адресов, добавленных параллельно между проверкой и вставкой
+        RecipientMailing.objects.bulk_create(new, ignore_conflicts=True)
+        result.created += len(new)
+        result.duplicates += len(existing)
+        if progress is not None:
+            progress(result)
+
+    if result.created:
+        # bulk_create не вызывает сигналы, счетчики главной страницы и списки получателей сбрасываем сами
+        counters.invalidate()
+        view_cache.objects_changed(RecipientMailing, [])
+    return result
@@ -0,0 +1,287 @@
+import logging
+import random
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+
+from mailing.ratelimit import host_limiter
+
+logger = logging.getLogger(__name__)
+
+# Вес нового замера в скользящем среднем времени отправки через реле
+LATENCY_ALPHA = 0.2
+RELAY_OPTIONS = ("host", "port", "username", "password", "use_tls", "use_ssl")
+
+
+class RelayHealth:
+    """Состояние SMTP-сервера (реле), общее для всех соединений процесса.
+
+    Хранит среднее время отправки и счетчики ошибок и работает как автомат размыкания (circuit breaker):
+    после failure_threshold ошибок подряд реле выводится из ротации на open_timeout секунд, затем
+    через него пропускается одна пробная отправка. Удачная проба возвращает реле в ротацию,
+    неудачная снова выводит его на open_timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, weight=1, failure_threshold=None, open_timeout=None):
+        self.name = name
+        self.weight = weight
+        self.failure_threshold = failure_threshold or settings.EMAIL_RELAY_FAILURE_THRESHOLD
+        self.open_timeout = settings.EMAIL_RELAY_OPEN_TIMEOUT if open_timeout is None else open_timeout
+        self.state = self.CLOSED
+        self.sent = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_candidate(self):
+        """Можно ли выбрать реле: оно в ротации или пора пропустить через него пробную отправку"""
+        if self.state == self.CLOSED:
+            return True
+        return not self._probing and time.monotonic() - self.opened_at >= self.open_timeout
+
+    def begin(self):
+        """Начало отправки через выбранное реле; для выведенного из ротации - захват единственной пробы"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self._probing or time.monotonic() - self.opened_at < self.open_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = True
+            return True
+
+    def record_success(self, latency):
+        with self._lock:
+            self.sent += 1
+            self.consecutive_failures = 0
+            self.latency = latency if self.latency is None else (
+                LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency
+            )
+            if self.state != self.CLOSED:
+                logger.info("SMTP-сервер %s возвращен в ротацию", self.name)
+            self.state = self.CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    logger.warning("SMTP-сервер %s выведен из ротации после %s ошибок подряд",
+                                   self.name, self.consecutive_failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    @property
+    def error_rate(self):
+        total = self.sent + self.failed
+        return self.failed / total if total else 0.0
+
+    @property
+    def effective_weight(self):
+        """Вес с поправкой на скорость: медленное реле получает меньше писем"""
+        return self.weight / (1 + (self.latency or 0.0))
+
+    def stats(self):
+        return {
+            "relay": self.name,
+            "state": self.state,
+            "sent": self.sent,
+            "failed": self.failed,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+        }
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def relay_name(config):
+    """Адрес реле host:port, по нему же ведется корзина токенов сервера"""
+    return f"{config.get('host') or settings.EMAIL_HOST}:{config.get('port') or settings.EMAIL_PORT}"
+
+
+def get_relay_health(config):
+    """Общее для процесса состояние реле по адресу host:port"""
+    name = relay_name(config)
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = RelayHealth(name, weight=config.get("weight", 1))
+        return health
+
+
+def get_relay_stats():
+    """Задержка, ошибки и состояние каждого реле процесса"""
+    with _health_lock:
+        return [health.stats() for health in _health.values()]
+
+
+def reset_relay_health():
+    with _health_lock:
+        _health.clear()
+
+
+def get_relays():
+    """Список реле из EMAIL_RELAYS; если он пуст - единственный сервер из EMAIL_HOST/EMAIL_PORT"""
+    return settings.EMAIL_RELAYS or [{}]
+
+
+def choose_relay(relays, exclude=()):
+    """Случайное реле с учетом веса и средней задержки среди тех, что в ротации; None, если таких нет.
+
+    relays - пары (состояние реле, данные), exclude - имена уже опробованных реле.
+    """
+    candidates = [(health, data) for health, data in relays if health.name not in exclude and health.is_candidate()]
+    if not candidates:
+        return None
+    return random.choices(candidates, weights=[health.effective_weight for health, _ in candidates])[0]
+
+
+def _is_relay_failure(error):
+    """Ошибка сервера, а не письма: обрыв, отказ в соединении, таймаут или временный ответ 4xx"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return isinstance(error, smtplib.SMTPConnectError) or error.smtp_code < 500
+    return True
+
+
+class RelayEmailBackend(BaseEmailBackend):
+    """Почтовый бэкенд, распределяющий письма по нескольким SMTP-серверам (EMAIL_RELAYS).
+
+    Реле выбирается случайно с учетом веса и средней задержки среди тех, что в ротации.
+    При ошибке сервера письмо отправляется через следующее реле; отказ получателя (5xx)
+    относится к письму и поднимается как обычно, не влияя на состояние реле. Соединения
+    с реле открываются в open() (или при первой отправке через реле) и остаются открытыми до close().
+    """
+
+    def __init__(self, relays=None, fail_silently=False, timeout=None, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.relays = [(get_relay_health(config), config) for config in (relays or get_relays())]
+        self.timeout = settings.EMAIL_RELAY_TIMEOUT if timeout is None else timeout
+        self._backends = {}
+
+    def _backend(self, health, config):
+        backend = self._backends.get(health.name)
+        if backend is None:
+            options = {key: config[key] for key in RELAY_OPTIONS if key in config}
+            backend = SMTPBackend(timeout=self.timeout, fail_silently=False, **options)
+            self._backends[health.name] = backend
+        return backend
+
+    @staticmethod
+    def _close(backend):
+        try:
+            backend.close()
+        except (smtplib.SMTPException, OSError):
+            backend.connection = None
+
+    def choose(self, exclude=()):
+        """Реле для очередного письма или None, если доступных не осталось"""
+        return choose_relay(self.relays, exclude)
+
+    def open(self):
+        """Открытие соединений со всеми реле в ротации, возвращает True, если открыто новое соединение.
+
+        Недоступное реле учитывается как ошибка сервера; исключение поднимается, только если
+        не удалось открыть ни одного соединения.
+        """
+        opened = False
+        error = None
+        for health, config in self.relays:
+            backend = self._backend(health, config)
+            if backend.connection is not None or not health.is_candidate():
+                continue
+            try:
+                backend.open()
+            except (smtplib.SMTPException, OSError) as relay_error:
+                health.record_failure()
+                logger.warning("Ошибка подключения к SMTP-серверу %s: %s", health.name, relay_error)
+                self._close(backend)
+                error = relay_error
+                continue
+            opened = True
+        if error is not None and not self.fail_silently and all(
+            backend.connection is None for backend in self._backends.values()
+        ):
+            raise error
+        return opened
+
+    def is_alive(self):
+        """Проверка открытых соединений командой NOOP: оборванные закрываются, True - есть живое соединение"""
+        alive = False
+        for backend in self._backends.values():
+            if backend.connection is None:
+                continue
+            try:
+                if backend.connection.noop()[0] == 250:
+                    alive = True
+                    continue
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close(backend)
+        return alive
+
+    def close(self):
+        for backend in self._backends.values():
+            self._close(backend)
+
+    def _send(self, message):
+        tried = set()
+        error = None
+        while (relay := self.choose(tried)) is not None:
+            health, config = relay
+            tried.add(health.name)
+            if not health.begin():
+                continue
+            limiter = host_limiter(health.name)
+            if limiter is not None:
+                limiter.acquire()
+            backend = self._backend(health, config)
+            started = time.monotonic()
+            try:
+                # Открытое здесь соединение остается открытым: SMTPBackend закрывает только открытые им самим
+                backend.open()
+                backend.send_messages([message])
+            except (smtplib.SMTPException, OSError) as relay_error:
+                if not _is_relay_failure(relay_error):
+                    # Сервер ответил, письмо отклонено - реле исправно
+                    health.record_success(time.monotonic() - started)
+                    raise
+                health.record_failure()
+                logger.warning("Ошибка SMTP-сервера %s: %s", health.name, relay_error)
+                self._close(backend)
+                error = relay_error
+                continue
+            health.record_success(time.monotonic() - started)
+            return True
+        raise error or smtplib.SMTPServerDisconnected("Нет доступных SMTP-серверов")
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                self._send(message)
+            except (smtplib.SMTPException, OSError):
+                if not self.fail_silently:
+                    raise
+            else:
+                sent += 1
+        return sent
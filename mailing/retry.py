@@ -0,0 +1,27 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+
+# Пока воркер отправляет повтор, доставка "арендована"; если он упадет, повтор снова станет доступен
+RETRY_LEASE = timedelta(minutes=10)
+
+
+def is_transient(code):
+    """Временная ли ошибка: ответ 4xx, обрыв соединения или таймаут (кода нет). Ответы 5xx - постоянные"""
+    return code is None or 400 <= code < 500
+
+
+def should_retry(code, retries):
+    """Нужно ли повторить отправку после ответа code, если повторов уже было retries"""
+    return is_transient(code) and retries < settings.MAILING_RETRY_MAX
+
+
+def backoff_delay(retries):
+    """Задержка перед очередным повтором: удваивается с каждым повтором, половина задержки случайна.
+
+    Случайная часть (jitter) разносит повторы писем, отложенных одновременно, чтобы они
+    не вернулись на почтовый сервер одной волной.
+    """
+    delay = min(settings.MAILING_RETRY_MAX_DELAY, settings.MAILING_RETRY_BASE_DELAY * 2 ** retries)
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
@@ -1,54 +1,449 @@
-from datetime import datetime, timedelta
+import smtplib
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import attrgetter
 
 from django.conf import settings
-from django.core.cache import cache
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from mailing import counters, view_cache
+from mailing.async_sender import AsyncSendingEngine
+from mailing.attachments import get_attachment_part
+from mailing.models import Mailing, MailingAttempt, MailingDelivery, MailingJob, Message, SuppressedEmail
+from mailing.personalization import compile_message
+from mailing.ratelimit import get_rate_limiter
+from mailing.retry import RETRY_LEASE, backoff_delay, should_retry
+from mailing.smtp_pool import SendResult, get_smtp_pool
+from mailing.suppression import HARD_BOUNCE_CODES, get_suppression_list, suppress
+from mailing.tiered_cache import TieredCache
+
+
+DELIVERY_BATCH_SIZE = 500
+SCHEDULER_BATCH_SIZE = 1000
+STALE_JOB_TIMEOUT = timedelta(minutes=30)
+
+MESSAGE_CACHE_FIELDS = ("id", "theme", "content", "html_content", "attachment", "owner_id")
+message_cache = TieredCache("messages")
+
+
+def batched(iterable, size):
+    """Разбиение последовательности на пачки заданного размера"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+_async_engine = None
+
+
+def get_sender(engine=None):
+    """Транспорт отправки писем: пул SMTP-соединений ("pool") или асинхронный движок ("async")"""
+    global _async_engine
+    engine = engine or settings.MAILING_SEND_ENGINE
+    if engine == "async":
+        if _async_engine is None:
+            _async_engine = AsyncSendingEngine()
+        return _async_engine
+    return get_smtp_pool()
+
+
+def snapshot_audience(mailing):
+    """Снимок аудитории рассылки: строка доставки "Ожидает" на каждый адрес, создается один раз.
+
+    Получатели, добавленные в рассылку после снимка, в текущую отправку не попадают, поэтому
+    перезапуск отправки после сбоя продолжает тот же список адресов.
+    """
+    if mailing.deliveries.exists():
+        return 0
+    created = 0
+    recipients = mailing.recipients.order_by("id").values_list("id", "email")
+    with transaction.atomic():
+        for batch in batched(recipients.iterator(chunk_size=DELIVERY_BATCH_SIZE), DELIVERY_BATCH_SIZE):
+            # Повтор адреса в рассылке отсекает уникальное ограничение (mailing, email)
+            rows = [MailingDelivery(mailing=mailing, recipient_id=pk, email=email) for pk, email in batch]
+            created += len(MailingDelivery.objects.bulk_create(rows, ignore_conflicts=True))
+    return created
+
+
+def deliver_batch(batch, compiled, attachment, sender, limiter=None, heartbeat=False):
+    """Отправка пачки доставок и фиксация их результатов одной транзакцией (контрольная точка).
+
+    Временные ошибки (ответ 4xx, обрыв соединения, таймаут) откладываются на повтор с экспоненциальной
+    задержкой; постоянные (5xx) и исчерпавшие число повторов фиксируются как недоставленные.
+    С heartbeat в той же транзакции обновляется отметка активности задания рассылки: пока она свежая,
+    resume_mailings не считает долгую отправку прерванной.
+    """
+    suppression = get_suppression_list()
+    suppression.refresh()
+    sending, messages = [], []
+    for delivery in batch:
+        recipient = delivery.recipient
+        # Удаленные, неактивные и заблокированные адреса отсеиваем до SMTP-транзакции
+        if recipient is None or not recipient.is_active or delivery.email in suppression:
+            delivery.status = MailingDelivery.STATUS_SKIPPED
+            continue
+        subject, body, html = compiled.render(recipient)
+        email = EmailMultiAlternatives(subject=subject, body=body, to=[delivery.email],
+                                       from_email=settings.EMAIL_HOST_USER)
+        if html is not None:
+            email.attach_alternative(html, "text/html")
+        if attachment is not None:
+            # Закодированная один раз часть подключается к каждому письму по ссылке
+            email.attach(attachment)
+        sending.append(delivery)
+        messages.append(email)
+    try:
+        results = sender.deliver_messages(messages, limiter) if messages else []
+    except (smtplib.SMTPException, OSError) as error:
+        # Почтовый сервер недоступен: вся пачка откладывается на повтор
+        results = [(None, str(error) or error.__class__.__name__)] * len(messages)
+
+    now = timezone.now()
+    results = [SendResult(*result) for result in results]
+    for delivery, (code, response, _) in zip(sending, results):
+        delivery.smtp_code = code
+        delivery.server_response = response[:150]
+        if code is not None and code < 400:
+            delivery.status = MailingDelivery.STATUS_OK
+        elif should_retry(code, delivery.retries):
+            delivery.status = MailingDelivery.STATUS_RETRY
+            delivery.next_retry_at = now + backoff_delay(delivery.retries)
+        else:
+            delivery.status = MailingDelivery.STATUS_NOK
+    for delivery in batch:
+        delivery.date_delivery = now
+        if delivery.status != MailingDelivery.STATUS_RETRY:
+            delivery.next_retry_at = None
+    with transaction.atomic():
+        MailingDelivery.objects.bulk_update(
+            batch, ["status", "smtp_code", "server_response", "date_delivery", "next_retry_at"]
+        )
+        if heartbeat:
+            MailingJob.objects.filter(mailing_id=batch[0].mailing_id, status=MailingJob.RUNNING).update(
+                heartbeat_at=now
+            )
+    # Блокируем только адреса, которые отверг сервер получателя: отказ отправителю или письму - не повод
+    bounced = [
+        delivery.email
+        for delivery, result in zip(sending, results)
+        if result.recipient_refused and result.code in HARD_BOUNCE_CODES
+    ]
+    if bounced:
+        suppress(bounced, SuppressedEmail.BOUNCE)
+
+
+def send_mailing(mailing, user=None, sender=None):
+    """Функция для отправки рассылки: отдельное письмо каждому получателю с фиксацией прогресса пачками.
+
+    Отправка идет по снимку аудитории (snapshot_audience): после каждой пачки результаты доставок
+    сохраняются в одной транзакции, поэтому повторный вызов после сбоя продолжает отправку
+    с первой незафиксированной пачки. Письма пачки, прерванной в момент сбоя, могут уйти повторно.
+    """
+    # Тема и текст разбираются один раз на рассылку, для получателя - только подстановка полей
+    message = get_message(mailing.message_id)
+    compiled = compile_message(message)
+    attachment = get_attachment_part(message)
+    if not start_mailing(mailing):
+        return
+    send_pending(mailing, compiled, attachment, sender or get_sender())
+    finish_mailing(mailing, user)
+
+
+def start_mailing(mailing):
+    """Перевод рассылки в статус "Запущена" и снимок аудитории; False, если рассылку отправлять нельзя"""
+    # Отключенную или уже завершенную рассылку не отправляем; время первой отправки из расписания сохраняем
+    now = timezone.now()
+    started = Mailing.objects.filter(pk=mailing.pk, status__in=[Mailing.CREATED, Mailing.LAUNCHED]).update(
+        status=Mailing.LAUNCHED, first_sending=Coalesce(F("first_sending"), now)
+    )
+    if not started:
+        return False
+    mailings_changed([mailing.pk])
+    if mailing.status != Mailing.LAUNCHED:
+        counters.invalidate()
+    snapshot_audience(mailing)
+    return True
+
+
+def send_pending(mailing, compiled, attachment, sender, first_id=None, last_id=None):
+    """Отправка ожидающих доставок рассылки пачками по возрастанию id, возвращает Counter статусов.
+
+    Если задан диапазон id [first_id, last_id], отправляются только доставки из него: так
+    параллельные процессы делят рассылку на непересекающиеся части. Пачка на время отправки
+    блокируется (SELECT ... FOR UPDATE SKIP LOCKED, если БД это поддерживает), поэтому второй
+    процесс, взявшийся за ту же рассылку, пропускает ее, а не отправляет те же письма повторно.
+    """
+    limiter = get_rate_limiter(mailing.owner_id)
+    pending = (
+        MailingDelivery.objects.filter(mailing=mailing, status=MailingDelivery.STATUS_PENDING)
+        .select_related("recipient")
+        .only("id", "email", "status", "retries", "recipient__id", "recipient__is_active",
+              *(f"recipient__{name}" for name in compiled.fields))
+        .order_by("id")
+    )
+    if last_id is not None:
+        pending = pending.filter(id__lte=last_id)
+    statuses = Counter()
+    last_id = first_id - 1 if first_id is not None else 0
+    # SQLite блокировок строк не поддерживает, а транзакция на время отправки пачки в нескольких
+    # процессах упиралась бы в блокировку всей БД: там пачки берутся без транзакции
+    locking = connection.features.has_select_for_update_skip_locked
+    if locking:
+        pending = pending.select_for_update(skip_locked=True, of=("self",))
+    while True:
+        with transaction.atomic() if locking else nullcontext():
+            batch = list(pending.filter(id__gt=last_id)[:DELIVERY_BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            deliver_batch(batch, compiled, attachment, sender, limiter, heartbeat=True)
+        statuses.update(delivery.status for delivery in batch)
+    return statuses
+
+
+def finish_mailing(mailing, user=None):
+    """Завершение отправки: статус рассылки и попытка с итогом по всему снимку аудитории"""
+    # Рассылка без окончания или с истекшим окном завершается сразу, остальные завершит планировщик
+    completed = Mailing.objects.filter(pk=mailing.pk, status=Mailing.LAUNCHED).filter(
+        Q(end_sending__isnull=True) | Q(end_sending__lte=timezone.now())
+    ).update(status=Mailing.COMPLETED)
+    if completed:
+        counters.mailing_changed((Mailing.LAUNCHED, mailing.owner_id), (Mailing.COMPLETED, mailing.owner_id))
+        mailings_changed([mailing.pk])
+
+    # Итог считается по всему снимку, включая пачки, отправленные до перезапуска
+    totals = mailing.deliveries.aggregate(
+        sent=Count("id", filter=Q(status=MailingDelivery.STATUS_OK)),
+        failed=Count("id", filter=Q(status=MailingDelivery.STATUS_NOK)),
+        skipped=Count("id", filter=Q(status=MailingDelivery.STATUS_SKIPPED)),
+        retry=Count("id", filter=Q(status=MailingDelivery.STATUS_RETRY)),
+    )
+    response = "Доставлено: {sent}, не доставлено: {failed}, пропущено: {skipped}".format(**totals)
+    if totals["retry"]:
+        response += f", ожидают повтора: {totals['retry']}"
+    MailingAttempt.objects.create(
+        mailing=mailing,
+        owner=user,
+        status=MailingAttempt.STATUS_OK if totals["sent"] else MailingAttempt.STATUS_NOK,
+        server_response=response,
+    )
 
-from django.utils import timezone
 
-from config.settings import CACHE_ENABLE
-from mailing.models import Mailing, MailingAttempt
-
-
-def send_mailing(self):
-    """Функция для отправки рассылки"""
-    email = [recipients.email for recipients in self.object.recipients.all()]
-
-    self.object.first_sending = timezone.now()
-    self.object.status = 'Запущена'
-    self.object.save()
-
-    server_response = send_mail(
-        subject=f'{self.object.message.theme}',
-        message=f'{self.object.message.content}',
-        recipient_list=email,
-        fail_silently=False,
-        from_email=settings.EMAIL_HOST_USER
-    )
-
-    self.object.end_sending = datetime.now() + timedelta(days=1)
-    if self.object.end_sending <= datetime.now():
-        self.object.status = 'Завершена'
-        self.object.save()
-
-    mailing_attempt = MailingAttempt.objects.create(mailing=self.object, server_response=server_response,
-                                                    owner=self.request.user)
-    if server_response:
-        mailing_attempt.status = 'Успешно'
-    else:
-        mailing_attempt.status = 'Не успешно'
-    mailing_attempt.save()
-
-
-def get_mailing_from_cache():
-    """Получение данных по рассылкам из кэша, если кэш пуст берем из БД"""
-    if not CACHE_ENABLE:
-        return Mailing.objects.all()
-    key = "mailing_list"
-    cache_data = cache.get(key)
-    if cache_data is not None:
-        return cache_data
-    cache_data = Mailing.objects.all()
-    cache.set(key, cache_data)
-    return cache_data
+def send_due_retries(sender=None, now=None, limit=None):
+    """Повторная отправка писем, у которых наступило время повтора; возвращает число обработанных.
+
+    Наступившие повторы выбираются одним запросом по частичному индексу mailing_delivery_retry_idx
+    и "арендуются" на RETRY_LEASE, поэтому несколько воркеров не возьмут одно письмо дважды.
+    Для отключенных рассылок повторы не выполняются.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = list(
+            MailingDelivery.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(status=MailingDelivery.STATUS_RETRY, next_retry_at__lte=now,
+                    mailing__status__in=[Mailing.LAUNCHED, Mailing.COMPLETED])
+            .order_by("next_retry_at", "id")
+            .values_list("id", flat=True)[:limit or DELIVERY_BATCH_SIZE]
+        )
+        if not due:
+            return 0
+        MailingDelivery.objects.filter(id__in=due).update(retries=F("retries") + 1, next_retry_at=now + RETRY_LEASE)
+
+    sender = sender or get_sender()
+    deliveries = (
+        MailingDelivery.objects.filter(id__in=due)
+        .select_related("recipient", "mailing")
+        .order_by("mailing_id", "id")
+    )
+    for mailing, group in groupby(deliveries, key=attrgetter("mailing")):
+        batch = list(group)
+        message = get_message(mailing.message_id)
+        deliver_batch(batch, compile_message(message), get_attachment_part(message), sender,
+                      get_rate_limiter(mailing.owner_id))
+        statuses = Counter(delivery.status for delivery in batch)
+        MailingAttempt.objects.create(
+            mailing=mailing,
+            owner_id=mailing.owner_id,
+            status=MailingAttempt.STATUS_OK if statuses[MailingDelivery.STATUS_OK] else MailingAttempt.STATUS_NOK,
+            server_response=(
+                f"Повторная отправка. Доставлено: {statuses[MailingDelivery.STATUS_OK]}, "
+                f"не доставлено: {statuses[MailingDelivery.STATUS_NOK]}, "
+                f"ожидают повтора: {statuses[MailingDelivery.STATUS_RETRY]}"
+            ),
+        )
+    return len(due)
+
+
+def enqueue_mailing(mailing, user=None):
+    """Постановка рассылки в очередь отправки, повторный запуск той же рассылки игнорируется"""
+    with transaction.atomic():
+        # Условный UPDATE не даст поставить рассылку в очередь дважды при повторном нажатии
+        launched = Mailing.objects.filter(pk=mailing.pk, status=Mailing.CREATED).update(status=Mailing.LAUNCHED)
+        if not launched:
+            return None
+        job = MailingJob.objects.create(mailing=mailing, owner=user)
+    counters.mailing_changed((Mailing.CREATED, mailing.owner_id), (Mailing.LAUNCHED, mailing.owner_id))
+    mailings_changed([mailing.pk])
+    return job
+
+
+def launch_due_mailings(now=None, limit=None):
+    """Запуск рассылок, у которых наступило время первой отправки.
+
+    Готовые рассылки выбираются одним запросом по частичному индексу mailing_due_idx, статус меняется
+    одним UPDATE, задания в очередь добавляются одним bulk_create.
+    """
+    now = now or timezone.now()
+    limit = limit or SCHEDULER_BATCH_SIZE
+    with transaction.atomic():
+        due = list(
+            Mailing.objects.select_for_update(skip_locked=True)
+            .filter(status=Mailing.CREATED, first_sending__lte=now)
+            .filter(Q(end_sending__isnull=True) | Q(end_sending__gt=now))
+            .order_by("first_sending")
+            .values_list("pk", "owner_id")[:limit]
+        )
+        if not due:
+            return 0
+        Mailing.objects.filter(pk__in=[pk for pk, _ in due]).update(status=Mailing.LAUNCHED)
+        MailingJob.objects.bulk_create([MailingJob(mailing_id=pk, owner_id=owner_id) for pk, owner_id in due])
+    for _, owner_id in due:
+        counters.mailing_changed((Mailing.CREATED, owner_id), (Mailing.LAUNCHED, owner_id))
+    mailings_changed([pk for pk, _ in due])
+    return len(due)
+
+
+def complete_expired_mailings(now=None):
+    """Завершение рассылок с истекшим окном отправки одним UPDATE.
+
+    Рассылки, которые еще отправляет воркер, не трогаем: send_mailing завершит их сам.
+    """
+    now = now or timezone.now()
+    active_jobs = MailingJob.objects.filter(mailing=OuterRef("pk"), status__in=[MailingJob.QUEUED, MailingJob.RUNNING])
+    completed = (
+        Mailing.objects.filter(status__in=[Mailing.CREATED, Mailing.LAUNCHED], end_sending__lte=now)
+        .exclude(Exists(active_jobs))
+        .update(status=Mailing.COMPLETED)
+    )
+    if completed:
+        counters.invalidate()
+        mailings_changed()
+    return completed
+
+
+def claim_mailing_job():
+    """Захват одного готового задания из очереди.
+
+    Строки, заблокированные другими воркерами, пропускаются (SELECT ... FOR UPDATE SKIP LOCKED),
+    поэтому несколько процессов могут разбирать очередь одновременно.
+    """
+    with transaction.atomic():
+        job = (
+            MailingJob.objects.select_for_update(skip_locked=True)
+            .filter(status=MailingJob.QUEUED, run_after__lte=timezone.now())
+            .order_by("run_after", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = MailingJob.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "heartbeat_at", "attempts"])
+    return job
+
+
+def start_mailing_job(mailing, user=None):
+    """Задание "Выполняется" для отправки рассылки вне очереди (команды send_mailing, send_mailing_parallel).
+
+    Задание рассылки, уже стоящее в очереди, захватывается, чтобы воркер не отправил ее повторно.
+    Пока задание активно, resume_mailings не считает рассылку прерванной. None - рассылку уже
+    отправляет другой процесс.
+    """
+    with transaction.atomic():
+        # Блокировка строки рассылки не дает двум процессам одновременно завести задания
+        list(Mailing.objects.select_for_update().filter(pk=mailing.pk).values_list("pk"))
+        active = MailingJob.objects.filter(mailing=mailing, status__in=[MailingJob.QUEUED, MailingJob.RUNNING])
+        if active.filter(status=MailingJob.RUNNING).exists():
+            return None
+        job = active.order_by("id").first() or MailingJob(mailing=mailing, owner=user)
+        job.status = MailingJob.RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.attempts += 1
+        job.save()
+    return job
+
+
+def finish_mailing_job(job, error=None):
+    """Фиксация результата задания: "Выполнено" или "Ошибка" с текстом ошибки"""
+    job.status = MailingJob.FAILED if error else MailingJob.DONE
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
+
+
+def run_mailing_job(job, sender=None):
+    """Выполнение задания: отправка рассылки и фиксация результата"""
+    mailing = job.mailing
+    try:
+        send_mailing(mailing, job.owner, sender)
+    except (smtplib.SMTPException, OSError) as error:
+        MailingAttempt.objects.create(mailing=mailing, server_response=str(error),
+                                      status=MailingAttempt.STATUS_NOK, owner=job.owner)
+        return finish_mailing_job(job, str(error))
+    return finish_mailing_job(job)
+
+
+def resume_mailings(stale_after=None, now=None):
+    """Возобновление рассылок, отправка которых прервалась (падение воркера или ошибка SMTP).
+
+    Задания "Выполняется" без контрольной точки (heartbeat_at) за последние stale_after считаются
+    прерванными. Для запущенных рассылок без активного задания, у которых остались ожидающие
+    доставки (или снимок аудитории еще не сделан), ставится новое задание: отправка продолжится
+    с последней контрольной точки.
+    """
+    now = now or timezone.now()
+    if stale_after is None:
+        stale_after = STALE_JOB_TIMEOUT
+    MailingJob.objects.alias(alive_at=Coalesce("heartbeat_at", "started_at")).filter(
+        status=MailingJob.RUNNING, alive_at__lt=now - stale_after
+    ).update(
+        status=MailingJob.FAILED, error="Задание прервано: воркер не завершил отправку", finished_at=now
+    )
+    jobs = MailingJob.objects.filter(mailing=OuterRef("pk"))
+    deliveries = MailingDelivery.objects.filter(mailing=OuterRef("pk"))
+    interrupted = list(
+        Mailing.objects.filter(status=Mailing.LAUNCHED)
+        .exclude(Exists(jobs.filter(status__in=[MailingJob.QUEUED, MailingJob.RUNNING])))
+        .filter(
+            Exists(deliveries.filter(status=MailingDelivery.STATUS_PENDING))
+            | (~Exists(deliveries) & ~Exists(jobs.filter(status=MailingJob.DONE)))
+        )
+        .values_list("pk", "owner_id")
+    )
+    return MailingJob.objects.bulk_create([MailingJob(mailing_id=pk, owner_id=owner_id)
+                                           for pk, owner_id in interrupted])
+
+
+def mailings_changed(pks=None):
+    """Сброс кэшей рассылок после UPDATE, который не вызывает сигналы"""
+    view_cache.objects_changed(Mailing, pks)
+
+
+def get_message(message_id):
+    """Сообщение рассылки для отправки из кэша (LRU процесса, затем Redis), если кэш пуст - из БД.
+
+    В кэше хранится компактный кортеж полей, а не объект модели, поэтому текст сообщения не
+    передается из БД с каждой строкой доставки. Кэш сбрасывается сигналом при изменении сообщений.
+    """
+    row = message_cache.get_or_set(
+        str(message_id), lambda: Message.objects.filter(pk=message_id).values_list(*MESSAGE_CACHE_FIELDS).get()
+    )
+    return Message(**dict(zip(MESSAGE_CACHE_FIELDS, row)))
@@ -0,0 +1,75 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from mailing import counters, suppression, view_cache
+from mailing.models import Mailing, MailingAttempt, Message, RecipientMailing, SuppressedEmail
+from mailing.services import message_cache
+from users.models import User
+
+
+@receiver(pre_save, sender=Mailing)
+@receiver(pre_save, sender=RecipientMailing)
+def remember_previous_state(sender, instance, **kwargs):
+    """Запоминаем статус и владельца до сохранения, чтобы изменить счетчики на разницу"""
+    instance._previous_state = None
+    if instance.pk is not None:
+        fields = ("status", "owner_id") if sender is Mailing else ("owner_id",)
+        instance._previous_state = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Mailing)
+def mailing_saved(sender, instance, created, **kwargs):
+    counters.mailing_changed(getattr(instance, "_previous_state", None), (instance.status, instance.owner_id))
+
+
+@receiver(post_delete, sender=Mailing)
+def mailing_deleted(sender, instance, **kwargs):
+    counters.mailing_changed(old=(instance.status, instance.owner_id))
+
+
+@receiver(post_save, sender=RecipientMailing)
+def recipient_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_state", None)
+    counters.recipient_changed(previous[0] if previous else None, instance.owner_id, created=created)
+
+
+@receiver(post_delete, sender=RecipientMailing)
+def recipient_deleted(sender, instance, **kwargs):
+    counters.recipient_changed(old_owner_id=instance.owner_id, deleted=True)
+
+
+@receiver(post_save, sender=Mailing)
+@receiver(post_delete, sender=Mailing)
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=RecipientMailing)
+@receiver(post_delete, sender=RecipientMailing)
+@receiver(post_save, sender=MailingAttempt)
+@receiver(post_delete, sender=MailingAttempt)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def object_changed(sender, instance, **kwargs):
+    """Сброс закэшированных страниц объекта и списков модели"""
+    view_cache.object_changed(sender, instance.pk)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def message_cache_changed(sender, **kwargs):
+    message_cache.invalidate()
+
+
+@receiver(m2m_changed, sender=Mailing.recipients.through)
+def mailing_recipients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        view_cache.objects_changed(Mailing, pk_set)
+    else:
+        view_cache.object_changed(Mailing, instance.pk)
+
+
+@receiver(post_delete, sender=SuppressedEmail)
+def suppression_deleted(sender, **kwargs):
+    # Новые адреса догружаются инкрементально, а удаление требует перечитать список целиком
+    suppression.invalidate()
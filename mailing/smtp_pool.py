@@ -0,0 +1,179 @@
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+# Итог SMTP-транзакции письма: код и текст ответа сервера; recipient_refused - сервер отказал именно
+# получателю (ответ на RCPT TO), а не отправителю (MAIL FROM) или содержимому письма (DATA)
+SendResult = namedtuple("SendResult", ["code", "response", "recipient_refused"], defaults=[False])
+
+
+class SMTPConnectionPool:
+    """Пул постоянных авторизованных SMTP-соединений процесса.
+
+    Соединение берется из пула на время отправки пачки писем и возвращается обратно,
+    поэтому TLS-рукопожатие и авторизация выполняются один раз, а не на каждую рассылку.
+    """
+
+    def __init__(self, size=None, idle_timeout=None, **backend_kwargs):
+        self.size = size or settings.EMAIL_POOL_SIZE
+        self.idle_timeout = idle_timeout if idle_timeout is not None else settings.EMAIL_POOL_IDLE_TIMEOUT
+        self.backend_kwargs = backend_kwargs
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _open(self):
+        """Открытие нового соединения с почтовым сервером"""
+        backend = get_connection(fail_silently=False, **self.backend_kwargs)
+        backend.open()
+        self._count("opened")
+        return backend
+
+    def _discard(self, backend):
+        """Закрытие соединения, которое больше нельзя использовать"""
+        try:
+            backend.close()
+        except (smtplib.SMTPException, OSError):
+            backend.connection = None
+        self._count("discarded")
+
+    @staticmethod
+    def _is_alive(backend):
+        """Проверка соединения командой NOOP"""
+        if hasattr(backend, "is_alive"):
+            # Бэкенд с несколькими соединениями (RelayEmailBackend) проверяет каждое сам
+            return backend.is_alive()
+        if not hasattr(backend, "connection"):
+            # Не SMTP-бэкенд (например, locmem в тестах) проверять не нужно
+            return True
+        if backend.connection is None:
+            return False
+        try:
+            return backend.connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self):
+        """Получение рабочего соединения: живое из пула или новое"""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    backend, last_used = self._idle.get_nowait()
+                except Empty:
+                    return self._open()
+                if time.monotonic() - last_used > self.idle_timeout or not self._is_alive(backend):
+                    # Сервер мог закрыть простаивающее соединение, открываем заново
+                    self._discard(backend)
+                    continue
+                self._count("reused")
+                return backend
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, backend, broken=False):
+        """Возврат соединения в пул"""
+        if broken or getattr(backend, "connection", True) is None:
+            self._discard(backend)
+        else:
+            self._idle.put((backend, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер для работы с соединением из пула"""
+        backend = self.acquire()
+        broken = False
+        try:
+            yield backend
+        except (smtplib.SMTPServerDisconnected, OSError):
+            broken = True
+            raise
+        finally:
+            self.release(backend, broken)
+
+    def _reconnect(self, backend):
+        """Переподключение соединения после обрыва сервером"""
+        self._discard(backend)
+        backend.open()
+        self._count("opened")
+
+    def _deliver(self, backend, message):
+        """Отправка одного письма, возвращает SendResult"""
+        try:
+            try:
+                backend.send_messages([message])
+            except smtplib.SMTPServerDisconnected:
+                self._reconnect(backend)
+                backend.send_messages([message])
+        except smtplib.SMTPRecipientsRefused as error:
+            code, response = next(iter(error.recipients.values()))
+            return SendResult(code, _as_text(response), recipient_refused=True)
+        except smtplib.SMTPResponseException as error:
+            # Отказ отправителю (SMTPSenderRefused) или письму (SMTPDataError) не говорит о получателе
+            return SendResult(error.smtp_code, _as_text(error.smtp_error))
+        except (smtplib.SMTPException, OSError) as error:
+            # Соединение не восстановилось: письмо уйдет на повтор, следующее письмо откроет соединение заново
+            self._discard(backend)
+            return SendResult(None, str(error) or error.__class__.__name__)
+        return SendResult(250, "OK")
+
+    def deliver_messages(self, email_messages, limiter=None):
+        """Отправка пачки писем через одно соединение из пула с результатом по каждому письму.
+
+        При обрыве соединения сервером выполняется переподключение и повтор текущего письма,
+        уже отправленные письма пачки повторно не отправляются. Если передан ограничитель скорости,
+        перед каждым письмом ожидаем токен.
+        """
+        results = []
+        with self.connection() as backend:
+            for message in email_messages:
+                if limiter is not None:
+                    limiter.acquire()
+                results.append(self._deliver(backend, message))
+        return results
+
+    def send_messages(self, email_messages):
+        """Отправка пачки писем, возвращает количество принятых сервером"""
+        return sum(1 for code, *_ in self.deliver_messages(email_messages) if code is not None and code < 400)
+
+    def close(self):
+        """Закрытие всех простаивающих соединений пула"""
+        while True:
+            try:
+                backend, _ = self._idle.get_nowait()
+            except Empty:
+                break
+            self._discard(backend)
+
+
+def _as_text(response):
+    """Ответ сервера в виде строки"""
+    if isinstance(response, bytes):
+        return response.decode(errors="replace")
+    return str(response)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """Пул соединений текущего процесса, создается при первом обращении"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool()
+        return _pool
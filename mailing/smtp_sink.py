@@ -0,0 +1,168 @@
+import asyncio
+import multiprocessing
+import threading
+from contextlib import contextmanager
+
+
+class SMTPSink:
+    """Локальный SMTP-сервер-заглушка для тестов и бенчмарков.
+
+    Поддерживает EHLO/AUTH/PIPELINING, принимает письма и только считает их, реальная доставка не выполняется.
+    Запускается в отдельном потоке со своим циклом событий:
+
+        with SMTPSink() as sink:
+            ...  # EMAIL_HOST="127.0.0.1", EMAIL_PORT=sink.port
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rejected=None, keep_messages=False):
+        self.host = host
+        self.port = port
+        self.latency = latency  # имитация задержки сервера на ответ после DATA, сек.
+        self.rejected = dict(rejected or {})  # адрес -> код отказа на MAIL FROM или RCPT
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.received = 0
+        self.connections = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Запуск сервера, возвращает себя с реальным номером порта"""
+        self._thread = threading.Thread(target=self._run, name="smtp-sink", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+    def _store(self, mail_from, recipients, data):
+        with self._lock:
+            self.received += 1
+            if self.keep_messages:
+                self.messages.append((mail_from, list(recipients), data))
+
+    async def _handle(self, reader, writer):
+        with self._lock:
+            self.connections += 1
+        mail_from, recipients = None, []
+        writer.write(b"220 sink ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    writer.write(b"250-sink\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN\r\n")
+                elif verb == "HELO":
+                    writer.write(b"250 sink\r\n")
+                elif verb == "AUTH":
+                    if command.upper().startswith("AUTH LOGIN"):
+                        writer.write(b"334 VXNlcm5hbWU6\r\n")
+                        await writer.drain()
+                        await reader.readline()
+                        writer.write(b"334 UGFzc3dvcmQ6\r\n")
+                        await writer.drain()
+                        await reader.readline()
+                    writer.write(b"235 Authentication succeeded\r\n")
+                elif verb == "MAIL":
+                    mail_from, recipients = _address(command), []
+                    code = self.rejected.get(mail_from)
+                    if code:
+                        mail_from = None
+                        writer.write(f"{code} Sender rejected\r\n".encode())
+                    else:
+                        writer.write(b"250 OK\r\n")
+                elif verb == "RCPT":
+                    address = _address(command)
+                    code = self.rejected.get(address)
+                    if code:
+                        writer.write(f"{code} Recipient rejected\r\n".encode())
+                    else:
+                        recipients.append(address)
+                        writer.write(b"250 OK\r\n")
+                elif verb == "DATA" and (mail_from is None or not recipients):
+                    writer.write(b"554 No valid recipients\r\n")
+                elif verb == "DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    chunks = []
+                    while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                        chunks.append(chunk)
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    self._store(mail_from, recipients, b"".join(chunks))
+                    mail_from, recipients = None, []
+                    writer.write(b"250 OK queued\r\n")
+                elif verb == "RSET":
+                    mail_from, recipients = None, []
+                    writer.write(b"250 OK\r\n")
+                elif verb == "NOOP":
+                    writer.write(b"250 OK\r\n")
+                elif verb == "QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    writer.write(b"500 Command not recognized\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def _address(command):
+    """Адрес из команды MAIL FROM:<...> / RCPT TO:<...>"""
+    value = command.split(":", 1)[1].strip()
+    return value.split(">", 1)[0].lstrip("<").strip()
+
+
+def _serve(port_queue, stop_event, latency):
+    with SMTPSink(latency=latency) as sink:
+        port_queue.put(sink.port)
+        stop_event.wait()
+
+
+@contextmanager
+def sink_process(latency=0.0):
+    """SMTP-заглушка в отдельном процессе, чтобы сервер не делил GIL с замеряемым кодом; возвращает порт"""
+    port_queue, stop_event = multiprocessing.Queue(), multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(port_queue, stop_event, latency), daemon=True)
+    process.start()
+    try:
+        yield port_queue.get(timeout=10)
+    finally:
+        stop_event.set()
+        process.join(timeout=10)
@@ -0,0 +1,89 @@
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 5
+POLL_INTERVAL = 0.02
+STALE_TTL = 60
+BETA = 1.0
+
+
+def _lock_key(key):
+    return f"{key}:rebuild"
+
+
+def acquire(key, cache=None, timeout=LOCK_TIMEOUT):
+    """Блокировка пересчета ключа (single-flight): атомарный cache.add, истекает сама, если процесс упал"""
+    return (cache or default_cache).add(_lock_key(key), 1, timeout)
+
+
+def release(key, cache=None):
+    (cache or default_cache).delete(_lock_key(key))
+
+
+def wait_for(read, timeout=WAIT_TIMEOUT):
+    """Ожидание значения, которое пересчитывает другой процесс; None, если не дождались"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        value = read()
+        if value is not None:
+            return value
+    return None
+
+
+def single_flight(key, compute, read, cache=None):
+    """Пересчет значения только одним процессом, остальные ждут его результат через read().
+
+    Если за WAIT_TIMEOUT значение не появилось (процесс с блокировкой упал или долго считает),
+    ожидающий считает сам, чтобы запрос не завис.
+    """
+    if acquire(key, cache):
+        try:
+            return compute()
+        finally:
+            release(key, cache)
+    value = wait_for(read)
+    return compute() if value is None else value
+
+
+def _should_recompute(delta, soft_expiry, beta):
+    """Вероятностный ранний пересчет (XFetch): чем ближе истечение и дольше пересчет, тем вероятнее"""
+    return time.time() - delta * beta * math.log(1 - random.random()) >= soft_expiry
+
+
+def get_or_compute(key, compute, timeout, cache=None, beta=BETA, stale_ttl=STALE_TTL):
+    """Значение из кэша с защитой от лавины пересчетов при истечении популярного ключа.
+
+    В кэше хранится (значение, время пересчета, мягкий срок). После мягкого срока запись живет
+    еще stale_ttl секунд: пока один процесс пересчитывает значение, остальные отдают устаревшее
+    (stale-while-revalidate). Незадолго до срока пересчет запускается заранее с вероятностью,
+    растущей к моменту истечения, поэтому ключ обычно обновляется раньше, чем устаревает.
+    """
+    cache = cache or default_cache
+
+    def store():
+        started = time.time()
+        value = compute()
+        entry = (value, time.time() - started, time.time() + timeout)
+        cache.set(key, entry, timeout + stale_ttl)
+        return entry
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, soft_expiry = entry
+        if not _should_recompute(delta, soft_expiry, beta):
+            return value
+        if acquire(key, cache):
+            try:
+                return store()[0]
+            finally:
+                release(key, cache)
+        # Пересчитывает другой процесс: отдаем устаревшее значение
+        return value
+
+    # Ключа нет совсем: считает один процесс, остальные ждут его результат
+    return single_flight(key, store, lambda: cache.get(key), cache)[0]
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from mailing.models import SuppressedEmail
+
+VERSION_KEY = "suppression:version"
+
+# Коды SMTP, означающие, что адреса не существует: на такой адрес больше не отправляем
+HARD_BOUNCE_CODES = {550, 551, 553}
+
+
+class SuppressionList:
+    """Множество заблокированных адресов в памяти процесса: проверка адреса за O(1) без запроса к БД.
+
+    Загружается один раз, затем раз в MAILING_SUPPRESSION_REFRESH секунд догружаются только новые
+    записи (id больше последнего загруженного). Удаление адреса из списка повышает версию в кэше,
+    и при следующем обновлении множество перечитывается целиком.
+    """
+
+    def __init__(self, refresh_interval=None):
+        self.refresh_interval = (settings.MAILING_SUPPRESSION_REFRESH if refresh_interval is None
+                                 else refresh_interval)
+        self._emails = set()
+        self._last_id = 0
+        self._version = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return
+            version = cache.get(VERSION_KEY)
+            if version != self._version:
+                self._emails, self._last_id, self._version = set(), 0, version
+            rows = SuppressedEmail.objects.filter(id__gt=self._last_id).order_by("id").values_list("id", "email")
+            for pk, email in rows.iterator(chunk_size=10000):
+                self._emails.add(email)
+                self._last_id = pk
+            self._refreshed_at = now
+
+    def __contains__(self, email):
+        return email.lower() in self._emails
+
+    def __len__(self):
+        return len(self._emails)
+
+
+_suppression_list = None
+
+
+def get_suppression_list():
+    """Общий для процесса список блокировки"""
+    global _suppression_list
+    if _suppression_list is None:
+        _suppression_list = SuppressionList()
+    return _suppression_list
+
+
+def suppress(emails, reason=SuppressedEmail.MANUAL):
+    """Добавление адресов в список блокировки, уже заблокированные пропускаются"""
+    rows = [SuppressedEmail(email=email.strip().lower(), reason=reason) for email in emails]
+    SuppressedEmail.objects.bulk_create(rows, ignore_conflicts=True)
+    if _suppression_list is not None:
+        _suppression_list.refresh(force=True)
+
+
+def invalidate():
+    """Полная перезагрузка списков всех процессов (после удаления адресов из блокировки)"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
@@ -1,5 +1,7 @@
 from django import template
 
+from users.roles import has_group
+
 register = template.Library()
 
 
@@ -12,4 +14,4 @@ def media_filter(path):
 
 @register.filter
 def in_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    return has_group(user, group_name)
@@ -1,3 +1,1061 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import checks, mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from mailing import counters, parallel, personalization, ratelimit, relays, retry, stampede, suppression
+from mailing.async_sender import AsyncSendingEngine
+from mailing.checks import rate_limit_cache_check
+from mailing.counters import get_home_counters
+from mailing.models import (Mailing, MailingAttempt, MailingDelivery, MailingJob, Message, RecipientMailing,
+                            SuppressedEmail)
+from mailing.personalization import compile_message
+from mailing.services import (claim_mailing_job, complete_expired_mailings, enqueue_mailing, get_message,
+                              launch_due_mailings, message_cache, resume_mailings, run_mailing_job, send_due_retries,
+                              send_mailing, start_mailing_job)
+from mailing.smtp_pool import SMTPConnectionPool
+from mailing.smtp_sink import SMTPSink
+from mailing.view_cache import get_stats
+from users.models import User
+
+DUMMY_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "mailing-tests"}}
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class ListViewQueryCountTest(TestCase):
+    """Количество запросов страниц списков не зависит от количества строк"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.client.force_login(self.user)
+        self.created = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.created += 1
+            number = self.created
+            message = Message.objects.create(theme=f"Тема {number}", content="Текст", owner=self.user)
+            mailing = Mailing.objects.create(message=message, owner=self.user)
+            mailing.recipients.add(*[
+                RecipientMailing.objects.create(email=f"r{number}-{index}@example.com", fio=f"Получатель {number}",
+                                                owner=self.user)
+                for index in range(3)
+            ])
+            MailingAttempt.objects.create(mailing=mailing, owner=self.user, status=MailingAttempt.STATUS_OK,
+                                          server_response="Доставлено: 3, не доставлено: 0")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url_name):
+        url = reverse(url_name)
+        self.add_rows(2)
+        few = self.count_queries(url)
+        self.add_rows(30)
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_mailing_list(self):
+        self.assert_constant_queries("mailing:mailing_list")
+
+    def test_recipient_list(self):
+        self.assert_constant_queries("mailing:recipientmailing_list")
+
+    def test_message_list(self):
+        self.assert_constant_queries("mailing:message_list")
+
+    def test_message_list_reads_only_rendered_columns(self):
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("mailing:message_list"))
+        self.assertContains(response, "owner@example.com")
+        sql = next(query["sql"] for query in queries
+                   if 'FROM "mailing_message"' in query["sql"] and "LIMIT" in query["sql"])
+        for column in ("html_content", "attachment", "password", "phone"):
+            self.assertNotIn(column, sql)
+
+    def test_attempt_list(self):
+        self.assert_constant_queries("mailing:attempt")
+
+    def test_mailing_list_is_paginated(self):
+        self.add_rows(30)
+        response = self.client.get(reverse("mailing:mailing_list"))
+        self.assertEqual(len(response.context["mailings"]), 20)
+        self.assertTrue(response.context["is_paginated"])
+
+    def test_keyset_pages_cover_all_rows(self):
+        self.add_rows(15)
+        url = reverse("mailing:recipientmailing_list")
+        expected = list(RecipientMailing.objects.order_by("fio", "id").values_list("pk", flat=True))
+
+        seen, pages, cursor = [], [], None
+        while True:
+            response = self.client.get(url, {"cursor": cursor} if cursor else {})
+            page = [recipient.pk for recipient in response.context["object_list"]]
+            pages.append((page, response.context["previous_cursor"]))
+            seen += page
+            cursor = response.context["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+        # Обратный проход по курсорам previous возвращает те же страницы
+        for (page, _), (_, previous_cursor) in zip(reversed(pages[:-1]), reversed(pages[1:])):
+            response = self.client.get(url, {"cursor": previous_cursor})
+            self.assertEqual([recipient.pk for recipient in response.context["object_list"]], page)
+
+    def test_keyset_invalid_cursor(self):
+        response = self.client.get(reverse("mailing:attempt"), {"cursor": "broken"})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class RecipientImportTest(TestCase):
+    """Массовая загрузка получателей из CSV"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.client.force_login(self.user)
+        RecipientMailing.objects.create(email="old@example.com", fio="Старый")
+
+    def test_import_view(self):
+        content = (
+            "email;fio;comment\n"
+            " New@Example.com ;Новый;Из файла\n"
+            "new@example.com;Дубль;\n"
+            "old@example.com;Старый;\n"
+            "not-an-email;Ошибка;\n"
+            "second@example.com;;\n"
+        ).encode()
+        upload = SimpleUploadedFile("recipients.csv", content, content_type="text/csv")
+        response = self.client.post(reverse("mailing:recipientmailing_import"), {"file": upload})
+
+        result = response.context["result"]
+        self.assertEqual((result.rows, result.created, result.duplicates, result.invalid), (5, 2, 2, 1))
+        created = RecipientMailing.objects.filter(owner=self.user).order_by("email")
+        self.assertEqual([(item.email, item.fio) for item in created],
+                         [("new@example.com", "Новый"), ("second@example.com", "second")])
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class StatisticsExportTest(TestCase):
+    """Потоковая выгрузка статистики в CSV"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        other = User.objects.create(email="other@example.com", username="other")
+        self.client.force_login(self.user)
+        self.mailings = []
+        for owner in (self.user, self.user, other):
+            message = Message.objects.create(theme="Тема", content="Текст", owner=owner)
+            mailing = Mailing.objects.create(message=message, owner=owner)
+            MailingAttempt.objects.create(mailing=mailing, owner=owner, status=MailingAttempt.STATUS_OK,
+                                          server_response="Доставлено: 1, не доставлено: 0")
+            MailingDelivery.objects.create(mailing=mailing, email=f"to{mailing.pk}@example.com",
+                                           status=MailingDelivery.STATUS_OK, smtp_code=250)
+            self.mailings.append(mailing)
+
+    def export(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+
+    def test_user_exports_only_own_rows(self):
+        self.assertEqual(len(self.export("mailing:attempt_export")), 3)
+        self.assertEqual(len(self.export("mailing:delivery_export")), 3)
+
+    def test_filters(self):
+        lines = self.export("mailing:delivery_export", mailing=self.mailings[0].pk)
+        self.assertEqual(len(lines), 2)
+        self.assertIn(f"to{self.mailings[0].pk}@example.com", lines[1])
+        self.assertEqual(len(self.export("mailing:attempt_export", date_to="2000-01-01")), 1)
+
+    def test_invalid_filter(self):
+        for value in ("вчера", "2024-13-01", "2024-02-30T10:00"):
+            response = self.client.get(reverse("mailing:attempt_export"), {"date_from": value})
+            self.assertEqual(response.status_code, 400, value)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_ENABLE=True)
+class ViewCacheTest(TestCase):
+    """Кэш страниц по пользователю и версии объекта"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.other = User.objects.create(email="other@example.com", username="other")
+        self.message = Message.objects.create(theme="Тема", content="Первый текст", owner=self.user)
+        self.url = reverse("mailing:message_detail", args=[self.message.pk])
+
+    def test_page_is_cached_until_object_changes(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(self.url), "Первый текст")
+        self.assertContains(self.client.get(self.url), "Первый текст")
+        self.assertEqual(get_stats(["message_detail"])["message_detail"], {"hit": 1, "miss": 1})
+
+        self.message.content = "Второй текст"
+        self.message.save()
+        self.assertContains(self.client.get(self.url), "Второй текст")
+
+    def test_page_is_not_shared_between_users(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_owner_change_refreshes_list(self):
+        manager = User.objects.create(email="manager@example.com", username="manager", is_superuser=True)
+        self.client.force_login(manager)
+        url = reverse("mailing:message_list")
+        # Первый ответ устанавливает CSRF-cookie, страница с ней кэшируется со второго запроса
+        self.client.get(url)
+        self.client.get(url)
+        self.assertContains(self.client.get(url), "owner@example.com")
+        self.assertEqual(get_stats(["message_list"])["message_list"]["hit"], 1)
+        self.user.email = "renamed@example.com"
+        self.user.save()
+        self.assertContains(self.client.get(url), "renamed@example.com")
+
+    @override_settings(CACHE_ENABLE=False)
+    def test_pages_not_cached_without_common_cache(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(self.url), "Первый текст")
+        # Изменение из другого процесса не повышает версию в локальном кэше этого процесса
+        Message.objects.filter(pk=self.message.pk).update(content="Второй текст")
+        self.assertContains(self.client.get(self.url), "Второй текст")
+        self.assertEqual(get_stats(["message_detail"])["message_detail"], {"hit": 0, "miss": 0})
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_ENABLE=True)
+class MessageCacheTest(TestCase):
+    """Двухуровневый кэш сообщений для отправки"""
+
+    def setUp(self):
+        cache.clear()
+        message_cache.local.clear()
+        self.addCleanup(message_cache.local.clear)
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.message = Message.objects.create(theme="Тема", content="Текст", owner=self.user)
+
+    def test_message_is_cached_and_invalidated(self):
+        self.assertEqual(get_message(self.message.pk).content, "Текст")
+        with self.assertNumQueries(0):
+            message = get_message(self.message.pk)
+        self.assertEqual((message.pk, message.theme, message.owner_id), (self.message.pk, "Тема", self.user.pk))
+        # Локальный уровень пуст - значение берется из общего кэша
+        message_cache.local.clear()
+        with self.assertNumQueries(0):
+            get_message(self.message.pk)
+
+        self.message.content = "Новый текст"
+        self.message.save()
+        self.assertEqual(get_message(self.message.pk).content, "Новый текст")
+        self.message.delete()
+        with self.assertRaises(Message.DoesNotExist):
+            get_message(self.message.pk)
+
+    def test_unreachable_remote_falls_back_to_local(self):
+        self.addCleanup(setattr, message_cache, "_remote_down_until", 0.0)
+        with mock.patch("django.core.cache.backends.locmem.LocMemCache.get", side_effect=ConnectionError("down")):
+            self.assertEqual(get_message(self.message.pk).content, "Текст")
+            with self.assertNumQueries(0):
+                get_message(self.message.pk)
+
+    @override_settings(CACHE_ENABLE=False)
+    def test_local_only_without_common_cache(self):
+        get_message(self.message.pk)
+        with self.assertNumQueries(0):
+            get_message(self.message.pk)
+        self.assertEqual(cache.get(message_cache.version_key), None)
+        self.message.theme = "Другая тема"
+        self.message.save()
+        self.assertEqual(get_message(self.message.pk).theme, "Другая тема")
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_ENABLE=True)
+class HomeCountersTest(TestCase):
+    """Счетчики главной страницы"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.message = Message.objects.create(theme="Тема", content="Текст", owner=self.user)
+        Mailing.objects.create(message=self.message, owner=self.user)
+
+    def test_counters_are_cached_and_updated_by_signals(self):
+        self.assertEqual(get_home_counters(self.user)["user_mailings"], 1)
+        Mailing.objects.create(message=self.message, owner=self.user, status=Mailing.LAUNCHED)
+        with self.assertNumQueries(0):
+            counters = get_home_counters(self.user)
+        self.assertEqual((counters["user_mailings"], counters["mailings_started"]), (2, 1))
+
+    @override_settings(CACHE_ENABLE=False)
+    def test_counters_not_cached_without_common_cache(self):
+        get_home_counters(self.user)
+        # Изменение из другого процесса не доходит до локального кэша этого процесса
+        Mailing.objects.filter(owner=self.user).update(status=Mailing.LAUNCHED)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_home_counters(self.user)["user_mailings_started"], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_ENABLE=True)
+class StampedeTest(TransactionTestCase):
+    """Защита от лавины пересчетов при истечении популярного ключа"""
+
+    def setUp(self):
+        cache.clear()
+        message_cache.local.clear()
+        self.addCleanup(message_cache.local.clear)
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.message = Message.objects.create(theme="Тема", content="Текст", owner=self.user)
+        Mailing.objects.create(message=self.message, owner=self.user)
+
+    @staticmethod
+    def read_concurrently(read, table, threads=16):
+        """Одновременное чтение из threads потоков с медленным запросом к таблице: результаты и запросы к ней"""
+        queries, results = [], []
+        barrier = threading.Barrier(threads)
+
+        def slow_query(execute, sql, params, many, context):
+            if table in sql:
+                queries.append(sql)
+                time.sleep(0.1)
+            return execute(sql, params, many, context)
+
+        def worker():
+            try:
+                with connection.execute_wrapper(slow_query):
+                    barrier.wait()
+                    results.append(read())
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results, queries
+
+    def test_expired_hot_key_is_rebuilt_once(self):
+        get_home_counters(self.user)
+        # Ключ истек: счетчики сброшены новой версией
+        counters.invalidate()
+        results, queries = self.read_concurrently(lambda: get_home_counters(self.user)["user_mailings"],
+                                                  "mailing_mailing")
+        self.assertEqual(results, [1] * 16)
+        self.assertEqual(len(queries), 1)
+
+    def test_expired_message_is_rebuilt_once(self):
+        get_message(self.message.pk)
+        # Ключ истек в общем кэше, локальные уровни процессов пусты
+        cache.delete(message_cache.key(str(self.message.pk)))
+        message_cache.local.clear()
+        results, queries = self.read_concurrently(lambda: get_message(self.message.pk).content, "mailing_message")
+        self.assertEqual(results, ["Текст"] * 16)
+        self.assertEqual(len(queries), 1)
+
+    def test_stale_value_served_while_revalidating(self):
+        key = message_cache.key(str(self.message.pk))
+        stale = (self.message.pk, "Тема", "Старый текст", None, "", self.user.pk)
+        cache.set(key, (stale, 0.5, time.time() - 1), 60)
+        # Пересчет уже идет в другом процессе: отдается устаревшее значение без запроса к БД
+        stampede.acquire(key)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_message(self.message.pk).content, "Старый текст")
+        stampede.release(key)
+        message_cache.local.clear()
+        self.assertEqual(get_message(self.message.pk).content, "Текст")
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class PersonalizationTest(TestCase):
+    """Персональная подстановка полей получателя в тему и текст"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        self.message = Message.objects.create(theme="{{ fio }}, привет", owner=self.user,
+                                              content="Письмо для {{email}}, {{ unknown }} и {literal}")
+
+    def test_render(self):
+        recipient = RecipientMailing(fio="Иван", email="ivan@example.com")
+        self.assertEqual(compile_message(self.message).render(recipient),
+                         ("Иван, привет", "Письмо для ivan@example.com, {{ unknown }} и {literal}", None))
+
+    def test_compiled_once_per_content(self):
+        compiled = compile_message(self.message)
+        self.assertIs(compile_message(Message.objects.get(pk=self.message.pk)), compiled)
+        self.message.content = "Новый текст"
+        self.assertIsNot(compile_message(self.message), compiled)
+
+    def test_send_mailing_personalizes_each_letter(self):
+        mailing = Mailing.objects.create(message=self.message, owner=self.user)
+        mailing.recipients.add(
+            RecipientMailing.objects.create(email="a@example.com", fio="Анна"),
+            RecipientMailing.objects.create(email="b@example.com", fio="Борис"),
+        )
+        send_mailing(mailing, self.user)
+        self.assertEqual(sorted(letter.subject for letter in mail.outbox), ["Анна, привет", "Борис, привет"])
+
+
+@override_settings(CACHES=DUMMY_CACHE, MEDIA_ROOT=tempfile.mkdtemp())
+class AttachmentTest(TestCase):
+    """Вложение кодируется один раз на рассылку"""
+
+    def test_attachment_encoded_once(self):
+        user = User.objects.create(email="owner@example.com", username="owner")
+        message = Message.objects.create(theme="Отчет", content="Во вложении", owner=user)
+        content = bytes(range(256)) * 100
+        message.attachment.save("отчет.pdf", ContentFile(content))
+        mailing = Mailing.objects.create(message=message, owner=user)
+        mailing.recipients.add(*[RecipientMailing.objects.create(email=f"r{index}@example.com", fio="Получатель")
+                                 for index in range(5)])
+
+        with mock.patch("mailing.attachments.base64.encodebytes", wraps=base64.encodebytes) as encode:
+            send_mailing(mailing, user)
+        self.assertEqual(encode.call_count, 1)
+
+        self.assertEqual(len(mail.outbox), 5)
+        for letter in mail.outbox:
+            part = letter.attachments[0]
+            self.assertEqual(part.get_payload(decode=True), content)
+            self.assertEqual(part.get_content_type(), "application/pdf")
+            self.assertEqual(part.get_filename(), "отчет.pdf")
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class HtmlEmailTest(TestCase):
+    """HTML-письмо с текстовой альтернативой"""
+
+    def test_send_html_mailing(self):
+        user = User.objects.create(email="owner@example.com", username="owner")
+        message = Message.objects.create(theme="Новости", content="Краткое описание", owner=user,
+                                         html_content="<p>Здравствуйте, {{ fio }}!</p>")
+        mailing = Mailing.objects.create(message=message, owner=user)
+        mailing.recipients.add(RecipientMailing.objects.create(email="a@example.com", fio="<Анна>"))
+
+        with mock.patch("mailing.personalization.render_html_skeleton",
+                        wraps=personalization.render_html_skeleton) as render:
+            send_mailing(mailing, user)
+            send_mailing(Mailing.objects.create(message=message, owner=user), user)
+        self.assertEqual(render.call_count, 1)
+
+        letter = mail.outbox[0]
+        html, content_type = letter.alternatives[0]
+        self.assertEqual(content_type, "text/html")
+        self.assertIn("Здравствуйте, &lt;Анна&gt;!</p>", html)
+        self.assertIn('<p style="', html)
+        self.assertTrue(letter.body.startswith("Здравствуйте, <Анна>!"))
+
+
+class SendingTestMixin:
+    """Подготовка тестов отправки: пустой список блокировки процесса и рассылка владельца с получателями"""
+
+    def setUp(self):
+        super().setUp()
+        suppression._suppression_list = None
+        self.addCleanup(setattr, suppression, "_suppression_list", None)
+
+    def create_mailing(self, recipients, content="Текст"):
+        """Рассылка self.mailing владельца self.user; recipients - адреса или несохраненные RecipientMailing"""
+        self.user = User.objects.create(email="owner@example.com", username="owner")
+        message = Message.objects.create(theme="Тема", content=content, owner=self.user)
+        self.mailing = Mailing.objects.create(message=message, owner=self.user)
+        recipients = [recipient if isinstance(recipient, RecipientMailing) else
+                      RecipientMailing(email=recipient, fio="Получатель") for recipient in recipients]
+        self.mailing.recipients.add(*RecipientMailing.objects.bulk_create(recipients))
+        return self.mailing
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class SuppressionTest(SendingTestMixin, TestCase):
+    """Неактивные и заблокированные адреса отсеиваются до отправки"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_mailing([
+            "ok@example.com",
+            RecipientMailing(email="inactive@example.com", fio="Неактивный", is_active=False),
+            "Unsubscribed@Example.com",
+        ])
+
+    def test_send_skips_inactive_and_suppressed(self):
+        SuppressedEmail.objects.create(email="unsubscribed@example.com", reason=SuppressedEmail.UNSUBSCRIBE)
+        send_mailing(self.mailing, self.user)
+        self.assertEqual([letter.to for letter in mail.outbox], [["ok@example.com"]])
+        self.assertEqual(self.mailing.mailing.get().server_response, "Доставлено: 1, не доставлено: 0, пропущено: 2")
+
+    def test_incremental_refresh(self):
+        suppression_list = suppression.SuppressionList(refresh_interval=0)
+        suppression.suppress(["first@example.com"])
+        suppression_list.refresh()
+        suppression.suppress(["SECOND@example.com"])
+        with self.assertNumQueries(1):
+            suppression_list.refresh()
+        self.assertIn("second@example.com", suppression_list)
+        self.assertIn("First@Example.com", suppression_list)
+        self.assertEqual(len(suppression_list), 2)
+
+    @override_settings(EMAIL_HOST_USER="sender@example.com")
+    def test_only_recipient_refusals_suppressed(self):
+        with SMTPSink(rejected={"ok@example.com": 550}) as sink:
+            pool = SMTPConnectionPool(size=1, backend="django.core.mail.backends.smtp.EmailBackend",
+                                      host="127.0.0.1", port=sink.port, username="", password="", use_ssl=False,
+                                      use_tls=False)
+            self.addCleanup(pool.close)
+            send_mailing(self.mailing, self.user, pool)
+        self.assertEqual(list(SuppressedEmail.objects.values_list("email", "reason")),
+                         [("ok@example.com", SuppressedEmail.BOUNCE)])
+
+    @override_settings(EMAIL_HOST_USER="sender@example.com")
+    def test_sender_refusal_is_not_suppressed(self):
+        with SMTPSink(rejected={"sender@example.com": 550}) as sink:
+            pool = SMTPConnectionPool(size=1, backend="django.core.mail.backends.smtp.EmailBackend",
+                                      host="127.0.0.1", port=sink.port, username="", password="", use_ssl=False,
+                                      use_tls=False)
+            engine = AsyncSendingEngine(connections=1, concurrency=1, host="127.0.0.1", port=sink.port, username="",
+                                        use_ssl=False, use_tls=False)
+            self.addCleanup(pool.close)
+            self.addCleanup(engine.close)
+            for sender in (pool, engine):
+                # Каждый транспорт отправляет рассылку с начала
+                Mailing.objects.filter(pk=self.mailing.pk).update(status=Mailing.CREATED)
+                self.mailing.deliveries.all().delete()
+                send_mailing(self.mailing, self.user, sender)
+                delivery = MailingDelivery.objects.get(mailing=self.mailing, email="ok@example.com")
+                self.assertEqual((delivery.status, delivery.smtp_code), (MailingDelivery.STATUS_NOK, 550))
+            self.assertEqual(sink.received, 0)
+        self.assertFalse(SuppressedEmail.objects.exists())
+
+
+@override_settings(CACHES=DUMMY_CACHE)
+class MailingQueueTest(SendingTestMixin, TestCase):
+    """Запуск рассылки из интерфейса ставит задание в очередь, отправляет его воркер"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_mailing(["r0@example.com", "r1@example.com"])
+        self.client.force_login(self.user)
+
+    def test_send_view_enqueues_job(self):
+        url = reverse("mailing:mailing_send", args=[self.mailing.pk])
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertRedirects(response, reverse("mailing:mailing_list"), fetch_redirect_response=False)
+        # В запросе ничего не отправляется, повторное нажатие не добавляет второе задание
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(self.mailing.deliveries.exists())
+        self.assertEqual(list(self.mailing.jobs.values_list("status", "owner_id")), [(MailingJob.QUEUED, self.user.pk)])
+        self.assertEqual(Mailing.objects.get(pk=self.mailing.pk).status, Mailing.LAUNCHED)
+
+        stranger = User.objects.create(email="stranger@example.com", username="stranger")
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_job_is_claimed_once(self):
+        enqueue_mailing(self.mailing, self.user)
+        job = claim_mailing_job()
+        self.assertEqual((job.mailing_id, job.status, job.attempts), (self.mailing.pk, MailingJob.RUNNING, 1))
+        self.assertIsNone(claim_mailing_job())
+
+        run_mailing_job(job)
+        self.assertEqual(sorted(letter.to[0] for letter in mail.outbox), ["r0@example.com", "r1@example.com"])
+        self.assertEqual(MailingJob.objects.get(pk=job.pk).status, MailingJob.DONE)
+        self.assertIsNone(claim_mailing_job())
+
+
+class SchedulerTest(SendingTestMixin, TestCase):
+    """Планировщик запускает рассылки по first_sending и завершает по end_sending"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_mailing(["r0@example.com"])
+        self.now = timezone.now()
+        self.hour = timedelta(hours=1)
+
+    def add_mailing(self, status=Mailing.CREATED, first_sending=None, end_sending=None):
+        return Mailing.objects.create(message=self.mailing.message, owner=self.user, status=status,
+                                      first_sending=first_sending, end_sending=end_sending)
+
+    @staticmethod
+    def query_plan(sql):
+        """План выполнения запроса, для PostgreSQL - без последовательного чтения таблицы"""
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(" ".join(str(value) for value in row) for row in cursor.fetchall())
+
+    def test_launch_due_mailings(self):
+        due = self.add_mailing(first_sending=self.now - self.hour)
+        future = self.add_mailing(first_sending=self.now + self.hour)
+        expired = self.add_mailing(first_sending=self.now - 2 * self.hour, end_sending=self.now - self.hour)
+
+        self.assertEqual(launch_due_mailings(now=self.now), 1)
+        statuses = dict(Mailing.objects.values_list("pk", "status"))
+        self.assertEqual([statuses[mailing.pk] for mailing in (due, future, expired)],
+                         [Mailing.LAUNCHED, Mailing.CREATED, Mailing.CREATED])
+        self.assertEqual(list(due.jobs.values_list("status", "owner_id")), [(MailingJob.QUEUED, self.user.pk)])
+
+        # Повторная проверка и ручной запуск не ставят рассылку в очередь второй раз
+        self.assertEqual(launch_due_mailings(now=self.now + self.hour / 2), 0)
+        self.assertIsNone(enqueue_mailing(due, self.user))
+        self.assertEqual(MailingJob.objects.filter(mailing=due).count(), 1)
+        # Наступило время второй рассылки
+        self.assertEqual(launch_due_mailings(now=self.now + 2 * self.hour), 1)
+        self.assertEqual(future.jobs.count(), 1)
+
+    def test_complete_expired_mailings(self):
+        created = self.add_mailing(end_sending=self.now - self.hour)
+        launched = self.add_mailing(Mailing.LAUNCHED, end_sending=self.now - self.hour)
+        sending = self.add_mailing(Mailing.LAUNCHED, end_sending=self.now - self.hour)
+        MailingJob.objects.create(mailing=sending, owner=self.user, status=MailingJob.RUNNING)
+        active = self.add_mailing(Mailing.LAUNCHED, end_sending=self.now + self.hour)
+
+        self.assertEqual(complete_expired_mailings(now=self.now), 2)
+        statuses = dict(Mailing.objects.values_list("pk", "status"))
+        self.assertEqual([statuses[mailing.pk] for mailing in (created, launched, sending, active)],
+                         [Mailing.COMPLETED, Mailing.COMPLETED, Mailing.LAUNCHED, Mailing.LAUNCHED])
+        self.assertEqual(complete_expired_mailings(now=self.now), 0)
+        self.assertEqual(complete_expired_mailings(now=self.now + 2 * self.hour), 1)
+
+    def test_scheduler_queries_use_partial_indexes(self):
+        for _ in range(20):
+            self.add_mailing(Mailing.COMPLETED, first_sending=self.now - self.hour, end_sending=self.now - self.hour)
+        with CaptureQueriesContext(connection) as queries:
+            launch_due_mailings(now=self.now)
+            complete_expired_mailings(now=self.now)
+        launch_sql = next(query["sql"] for query in queries if "first_sending" in query["sql"])
+        complete_sql = next(query["sql"] for query in queries if query["sql"].startswith("UPDATE"))
+        self.assertIn("mailing_due_idx", self.query_plan(launch_sql))
+        self.assertIn("mailing_expiring_idx", self.query_plan(complete_sql))
+
+    def test_scheduler_command(self):
+        self.add_mailing(first_sending=self.now - self.hour)
+        self.add_mailing(Mailing.LAUNCHED, end_sending=self.now - self.hour)
+        out = StringIO()
+        call_command("run_mailing_scheduler", "--once", stdout=out)
+        self.assertIn("Запущено рассылок: 1, завершено: 1", out.getvalue())
+        self.assertEqual(MailingJob.objects.filter(status=MailingJob.QUEUED).count(), 1)
+
+
+class CrashingSender:
+    """Транспорт, который "падает" на заданной пачке, не отправив ее"""
+
+    def __init__(self, crash_on):
+        self.crash_on = crash_on
+        self.calls = 0
+        self.sent = []
+
+    def deliver_messages(self, email_messages, limiter=None):
+        self.calls += 1
+        if self.calls == self.crash_on:
+            raise SystemExit("Процесс отправки остановлен")
+        self.sent.extend(message.to[0] for message in email_messages)
+        return [(250, "OK") for _ in email_messages]
+
+
+class ResumableSendingTest(SendingTestMixin, TestCase):
+    """Прерванная отправка продолжается с последней контрольной точки без дублей и пропусков"""
+
+    def setUp(self):
+        super().setUp()
+        self.emails = [f"r{index}@example.com" for index in range(7)]
+        self.create_mailing(self.emails, content="Здравствуйте, {{ fio }}")
+
+    @mock.patch("mailing.services.DELIVERY_BATCH_SIZE", 2)
+    def test_resume_after_crash(self):
+        enqueue_mailing(self.mailing, self.user)
+        job = claim_mailing_job()
+        crashing = CrashingSender(crash_on=3)
+        with self.assertRaises(SystemExit):
+            send_mailing(job.mailing, self.user, crashing)
+
+        # Зафиксированы две пачки, остальные адреса снимка ожидают отправки
+        self.assertEqual(crashing.sent, self.emails[:4])
+        self.assertEqual(self.mailing.deliveries.filter(status=MailingDelivery.STATUS_PENDING).count(), 3)
+        self.assertEqual(Mailing.objects.get(pk=self.mailing.pk).status, Mailing.LAUNCHED)
+        # Получатель, добавленный после запуска, в эту отправку не попадает
+        self.mailing.recipients.add(RecipientMailing.objects.create(email="late@example.com", fio="Поздний"))
+        # Пока задание воркера не устарело, рассылку не трогаем
+        self.assertEqual(resume_mailings(), [])
+
+        call_command("resume_mailings", "--now", "--stale", "0", stdout=StringIO())
+
+        resent = [letter.to[0] for letter in mail.outbox]
+        self.assertEqual(resent, self.emails[4:])
+        self.assertEqual(sorted(crashing.sent + resent), sorted(self.emails))
+        self.assertFalse(self.mailing.deliveries.filter(status=MailingDelivery.STATUS_PENDING).exists())
+        self.assertEqual(Mailing.objects.get(pk=self.mailing.pk).status, Mailing.COMPLETED)
+        self.assertEqual(MailingJob.objects.get(pk=job.pk).status, MailingJob.FAILED)
+        self.assertEqual(self.mailing.mailing.get().server_response, "Доставлено: 7, не доставлено: 0, пропущено: 0")
+        self.assertEqual(resume_mailings(), [])
+
+    @mock.patch("mailing.services.DELIVERY_BATCH_SIZE", 2)
+    def test_long_running_job_is_not_resumed(self):
+        enqueue_mailing(self.mailing, self.user)
+        job = claim_mailing_job()
+        # Отправка началась два часа назад, но каждая пачка обновляет контрольную точку задания
+        long_ago = timezone.now() - timedelta(hours=2)
+        MailingJob.objects.filter(pk=job.pk).update(started_at=long_ago, heartbeat_at=long_ago)
+        with self.assertRaises(SystemExit):
+            send_mailing(job.mailing, self.user, CrashingSender(crash_on=3))
+        self.assertEqual(resume_mailings(), [])
+        self.assertEqual(MailingJob.objects.get(pk=job.pk).status, MailingJob.RUNNING)
+        # Контрольных точек нет дольше STALE_JOB_TIMEOUT - задание прервано
+        self.assertEqual(len(resume_mailings(now=timezone.now() + timedelta(hours=1))), 1)
+        self.assertEqual(MailingJob.objects.get(pk=job.pk).status, MailingJob.FAILED)
+
+    @mock.patch("mailing.services.DELIVERY_BATCH_SIZE", 2)
+    def test_direct_send_is_not_resumed(self):
+        job = start_mailing_job(self.mailing, self.user)
+        with self.assertRaises(SystemExit):
+            send_mailing(self.mailing, self.user, CrashingSender(crash_on=2))
+        # Пока команда отправляет рассылку, воркер и resume_mailings ее не берут
+        self.assertEqual(resume_mailings(), [])
+        self.assertIsNone(start_mailing_job(self.mailing, self.user))
+        with self.assertRaises(CommandError):
+            call_command("send_mailing", self.mailing.pk, stdout=StringIO())
+
+        MailingJob.objects.filter(pk=job.pk).update(status=MailingJob.FAILED)
+        call_command("send_mailing", self.mailing.pk, stdout=StringIO())
+        self.assertEqual([letter.to[0] for letter in mail.outbox], self.emails[2:])
+        self.assertEqual(MailingJob.objects.filter(status=MailingJob.DONE).count(), 1)
+        self.assertEqual(resume_mailings(), [])
+
+    def test_direct_send_takes_queued_job(self):
+        job = enqueue_mailing(self.mailing, self.user)
+        call_command("send_mailing", self.mailing.pk, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(list(MailingJob.objects.values_list("pk", "status")), [(job.pk, MailingJob.DONE)])
+        self.assertIsNone(claim_mailing_job())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TokenBucketTest(TestCase):
+    """Корзина токенов ограничителя скорости"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_debt_outlives_refill_time(self):
+        bucket = ratelimit.TokenBucket("test", per_minute=60, burst=10)
+        with mock.patch("mailing.ratelimit.cache", wraps=cache) as wrapped:
+            self.assertAlmostEqual(bucket.reserve(100), 90, delta=0.1)
+        # Долг в 90 токенов при 1 токене в секунду: ключ живет не меньше времени полного пополнения
+        timeout = wrapped.set.call_args.args[2]
+        self.assertGreaterEqual(timeout, 100)
+        self.assertLess(bucket.level(), -89)
+
+    @override_settings(MAILING_RATE_LIMIT_OWNER=60, CACHE_ENABLE=False)
+    def test_limits_without_common_cache_warn(self):
+        # Без общего кэша корзина у каждого процесса своя: лимит не соблюдается в сумме по воркерам
+        self.assertIn("mailing.W001", [message.id for message in checks.run_checks()])
+        with override_settings(CACHE_ENABLE=True):
+            self.assertEqual(rate_limit_cache_check(None), [])
+        with override_settings(MAILING_RATE_LIMIT_OWNER=0):
+            self.assertEqual(rate_limit_cache_check(None), [])
+
+
+class SMTPPoolTest(TestCase):
+    """Пул SMTP-соединений: проверка NOOP перед выдачей и переподключение к перезапущенному серверу"""
+
+    @staticmethod
+    def letters(count):
+        return [EmailMessage("Тема", "Текст", "from@example.com", [f"r{index}@example.com"]) for index in range(count)]
+
+    def test_reconnect_after_server_restart(self):
+        sink = SMTPSink().start()
+        pool = SMTPConnectionPool(size=1, backend="django.core.mail.backends.smtp.EmailBackend", host="127.0.0.1",
+                                  port=sink.port, username="", password="", use_ssl=False, use_tls=False)
+        self.addCleanup(pool.close)
+        self.assertEqual(pool.send_messages(self.letters(3)), 3)
+        self.assertEqual(pool.send_messages(self.letters(3)), 3)
+        self.assertEqual(pool.stats, {"opened": 1, "reused": 1, "discarded": 0})
+
+        # Сервер перезапущен: соединение в пуле не проходит NOOP и заменяется новым
+        sink.stop()
+        restarted = SMTPSink(port=sink.port).start()
+        self.addCleanup(restarted.stop)
+        self.assertEqual(pool.send_messages(self.letters(3)), 3)
+        self.assertEqual(pool.stats, {"opened": 2, "reused": 1, "discarded": 1})
+        self.assertEqual(pool.send_messages(self.letters(3)), 3)
+        self.assertEqual(pool.stats, {"opened": 2, "reused": 2, "discarded": 1})
+        self.assertEqual((sink.received, restarted.received, restarted.connections), (6, 6, 1))
+
+
+class ScriptedSender:
+    """Транспорт с заранее заданными ответами SMTP по адресам, последний ответ повторяется"""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.sent = []
+
+    def deliver_messages(self, email_messages, limiter=None):
+        results = []
+        for message in email_messages:
+            address = message.to[0]
+            self.sent.append(address)
+            replies = self.replies.get(address, [250])
+            code = replies.pop(0) if len(replies) > 1 else replies[0]
+            results.append((code, "OK" if code == 250 else "Ошибка"))
+        return results
+
+
+@override_settings(MAILING_RETRY_MAX=2, MAILING_RETRY_BASE_DELAY=60, MAILING_RETRY_MAX_DELAY=600)
+class RetryTest(SendingTestMixin, TestCase):
+    """Временные ошибки SMTP повторяются с экспоненциальной задержкой, постоянные - нет"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_mailing([f"{name}@example.com" for name in ("ok", "busy", "gone", "down")])
+
+    def delivery(self, name):
+        return MailingDelivery.objects.get(mailing=self.mailing, email=f"{name}@example.com")
+
+    def test_backoff_grows_with_jitter(self):
+        for retries, delay in enumerate([60, 120, 240, 480, 600, 600]):
+            seconds = retry.backoff_delay(retries).total_seconds()
+            self.assertGreaterEqual(seconds, delay / 2)
+            self.assertLessEqual(seconds, delay)
+
+    def test_pool_counts_connection_failures(self):
+        pool = SMTPConnectionPool(size=1)
+        letters = [EmailMessage("Тема", "Текст", "from@example.com", ["down@example.com"])]
+        with mock.patch.object(SMTPConnectionPool, "_deliver", return_value=(None, "Connection refused")):
+            self.assertEqual(pool.send_messages(letters), 0)
+
+    def test_transient_failures_retried(self):
+        sender = ScriptedSender({"busy@example.com": [451, 250], "gone@example.com": [550],
+                                 "down@example.com": [None]})
+        send_mailing(self.mailing, self.user, sender)
+
+        self.assertEqual(self.delivery("ok").status, MailingDelivery.STATUS_OK)
+        gone = self.delivery("gone")
+        self.assertEqual((gone.status, gone.retries, gone.next_retry_at), (MailingDelivery.STATUS_NOK, 0, None))
+        busy = self.delivery("busy")
+        self.assertEqual(busy.status, MailingDelivery.STATUS_RETRY)
+        self.assertGreater(busy.next_retry_at, timezone.now())
+        self.assertEqual(self.mailing.mailing.get().server_response,
+                         "Доставлено: 1, не доставлено: 1, пропущено: 0, ожидают повтора: 2")
+
+        # Время повтора еще не наступило: воркер делает один запрос и ничего не отправляет
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(send_due_retries(sender), 0)
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("SELECT")]), 1)
+        later = timezone.now() + timedelta(days=1)
+        self.assertEqual(send_due_retries(sender, now=later), 2)
+        busy = self.delivery("busy")
+        self.assertEqual((busy.status, busy.retries, busy.next_retry_at), (MailingDelivery.STATUS_OK, 1, None))
+        self.assertEqual(self.delivery("down").status, MailingDelivery.STATUS_RETRY)
+
+        # Последний разрешенный повтор тоже не удался: доставка фиксируется как недоставленная
+        self.assertEqual(send_due_retries(sender, now=later + timedelta(days=1)), 1)
+        down = self.delivery("down")
+        self.assertEqual((down.status, down.retries), (MailingDelivery.STATUS_NOK, 2))
+        self.assertEqual(sender.sent.count("down@example.com"), 3)
+        self.assertEqual(sender.sent.count("gone@example.com"), 1)
+        self.assertEqual(send_due_retries(sender, now=later + timedelta(days=2)), 0)
+
+
+@override_settings(EMAIL_RELAY_FAILURE_THRESHOLD=2, EMAIL_RELAY_OPEN_TIMEOUT=0.2)
+class RelayBackendTest(TestCase):
+    """Распределение писем по нескольким SMTP-серверам, вывод неисправного из ротации и возврат"""
+
+    def setUp(self):
+        relays.reset_relay_health()
+        self.addCleanup(relays.reset_relay_health)
+
+    def start_sink(self, port=0):
+        sink = SMTPSink(port=port).start()
+        self.addCleanup(sink.stop)
+        return sink
+
+    @staticmethod
+    def relay(sink_or_port, weight):
+        port = getattr(sink_or_port, "port", sink_or_port)
+        return {"host": "127.0.0.1", "port": port, "username": "", "use_ssl": False, "use_tls": False,
+                "weight": weight}
+
+    @staticmethod
+    def letters(count):
+        return [EmailMessage("Тема", "Текст", "from@example.com", [f"r{index}@example.com"]) for index in range(count)]
+
+    def test_weighted_spread(self):
+        main, spare = self.start_sink(), self.start_sink()
+        backend = relays.RelayEmailBackend(relays=[self.relay(main, 3), self.relay(spare, 1)])
+        self.assertEqual(backend.send_messages(self.letters(200)), 200)
+        backend.close()
+        self.assertEqual(main.received + spare.received, 200)
+        self.assertGreater(spare.received, 0)
+        self.assertGreater(main.received, spare.received * 1.5)
+        stats = {item["relay"]: item for item in relays.get_relay_stats()}
+        self.assertEqual(stats[f"127.0.0.1:{main.port}"]["sent"], main.received)
+        self.assertIsNotNone(stats[f"127.0.0.1:{spare.port}"]["latency_ms"])
+
+    def test_failover_and_probe(self):
+        healthy = self.start_sink()
+        down = SMTPSink().start()
+        down.stop()
+        backend = relays.RelayEmailBackend(relays=[self.relay(healthy, 1), self.relay(down.port, 100)])
+        self.addCleanup(backend.close)
+
+        # Письма не теряются, а неисправный сервер после двух ошибок подряд выводится из ротации
+        self.assertEqual(backend.send_messages(self.letters(20)), 20)
+        self.assertEqual(healthy.received, 20)
+        health = relays.get_relay_health(self.relay(down.port, 100))
+        self.assertEqual((health.state, health.failed), (relays.RelayHealth.OPEN, 2))
+
+        # Сервер поднялся: по истечении паузы пробная отправка возвращает его в ротацию
+        restored = self.start_sink(port=down.port)
+        time.sleep(0.25)
+        self.assertEqual(backend.send_messages(self.letters(20)), 20)
+        self.assertEqual(health.state, relays.RelayHealth.CLOSED)
+        self.assertGreater(restored.received, 0)
+        self.assertEqual(healthy.received + restored.received, 40)
+
+    def test_recipient_refusal_is_not_relay_failure(self):
+        sink = SMTPSink(rejected={"r0@example.com": 550}).start()
+        self.addCleanup(sink.stop)
+        backend = relays.RelayEmailBackend(relays=[self.relay(sink, 1)])
+        self.addCleanup(backend.close)
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            backend.send_messages(self.letters(1))
+        health = relays.get_relay_health(self.relay(sink, 1))
+        self.assertEqual((health.state, health.failed, health.sent), (relays.RelayHealth.CLOSED, 0, 1))
+
+    def test_pool_keeps_relay_connections_open(self):
+        sink = self.start_sink()
+        pool = SMTPConnectionPool(size=1, backend="mailing.relays.RelayEmailBackend", relays=[self.relay(sink, 1)])
+        self.addCleanup(pool.close)
+        with mock.patch("mailing.relays.host_limiter", return_value=None) as limiter:
+            for _ in range(3):
+                self.assertEqual(pool.send_messages(self.letters(10)), 10)
+        self.assertEqual((sink.received, sink.connections), (30, 1))
+        self.assertEqual((pool.stats["opened"], pool.stats["reused"]), (1, 2))
+        # Лимит скорости сервера ведется по выбранному реле
+        limiter.assert_called_with(f"127.0.0.1:{sink.port}")
+
+    def test_async_engine_uses_relays(self):
+        healthy = self.start_sink()
+        down = SMTPSink().start()
+        down.stop()
+        with override_settings(EMAIL_RELAYS=[self.relay(healthy, 1), self.relay(down.port, 100)]):
+            engine = AsyncSendingEngine(connections=1, concurrency=1)
+        self.addCleanup(engine.close)
+        results = engine.deliver_messages(self.letters(10))
+        self.assertEqual([code for code, *_ in results], [250] * 10)
+        self.assertEqual(healthy.received, 10)
+        health = relays.get_relay_health(self.relay(down.port, 100))
+        self.assertEqual(health.state, relays.RelayHealth.OPEN)
+
+
+class ParallelSendingTest(SendingTestMixin, TransactionTestCase):
+    """Большая рассылка отправляется несколькими процессами без дублей и пропусков"""
+
+    def test_split_ranges(self):
+        self.assertEqual(parallel.split_ranges(1, 10, 3), [(1, 4), (5, 7), (8, 10)])
+        self.assertEqual(parallel.split_ranges(5, 6, 4), [(5, 5), (6, 6)])
+
+    def test_parallel_send(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Процессы пула не видят тестовую БД SQLite в памяти")
+        emails = [f"r{index}@example.com" for index in range(60)]
+        mailing = self.create_mailing(emails, content="Здравствуйте, {{ fio }}")
+        user = self.user
+
+        sink = SMTPSink(keep_messages=True).start()
+        self.addCleanup(sink.stop)
+        relay = {"host": "127.0.0.1", "port": sink.port, "username": "", "use_ssl": False, "use_tls": False}
+        with override_settings(EMAIL_BACKEND="mailing.relays.RelayEmailBackend", EMAIL_RELAYS=[relay],
+                               MAILING_SEND_ENGINE="pool"):
+            results = parallel.send_mailing_parallel(mailing, user, workers=2)
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(sum(result.letters for result in results), 60)
+        self.assertEqual(sorted(recipients[0] for _, recipients, _ in sink.messages), sorted(emails))
+        self.assertEqual(mailing.deliveries.filter(status=MailingDelivery.STATUS_OK).count(), 60)
+        self.assertEqual(Mailing.objects.get(pk=mailing.pk).status, Mailing.COMPLETED)
+        self.assertEqual(mailing.mailing.get().server_response, "Доставлено: 60, не доставлено: 0, пропущено: 0")
+        # Отправка шла под заданием "Выполняется", поэтому resume_mailings ее не перехватывал
+        self.assertEqual(mailing.jobs.get().status, MailingJob.DONE)
+
+
+class MailingBenchmarkTest(SendingTestMixin, TestCase):
+    """Бенчмарк на малом объеме: отчет со всеми разделами, синтетические данные удалены"""
+
+    def test_benchmark_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            call_command("mailing_benchmark", "--scale", "40", "--users", "2", "--mailings", "3", "--attempts", "5",
+                         "--requests", "3", "--output", path, stdout=StringIO())
+            with open(path, encoding="utf-8") as file:
+                report = json.load(file)
+
+        self.assertEqual(report["send"]["letters"], 40)
+        self.assertGreater(report["send"]["messages_per_second"], 0)
+        self.assertLessEqual(report["send"]["latency"]["p50_ms"], report["send"]["latency"]["p99_ms"])
+        self.assertEqual(set(report["views"]), {"IndexView", "MailingListView", "MailingAttemptListView"})
+        for result in report["views"].values():
+            self.assertEqual(result["requests"], 3)
+            self.assertGreater(result["queries_cold"], 0)
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(RecipientMailing.objects.exists())
+
+
+class BenchmarkSendingTest(TestCase):
+    """Замер транспортов отправки: строки только транспорта и полного пути send_mailing"""
+
+    def test_rows(self):
+        out = StringIO()
+        call_command("benchmark_sending", "--recipients", "30", "--connections", "1", "--concurrency", "5", stdout=out)
+        rows = out.getvalue().splitlines()
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len([row for row in rows if row.startswith("send_mailing с БД, ")]), 2)
+        self.assertTrue(all(": 30 писем за " in row for row in rows))
+        # Синтетическая рассылка удалена после замера
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Mailing.objects.exists())
+
+
+class ExplainViewsTest(TestCase):
+    """Команда explain_views выводит план запроса каждой страницы"""
+
+    def test_plan_for_each_view(self):
+        user = User.objects.create(email="owner@example.com", username="owner")
+        out = StringIO()
+        call_command("explain_views", "--user", user.email, stdout=out)
+        lines = out.getvalue().splitlines()
+        for view in ("IndexView: счетчики главной страницы", "RecipientMailingListView", "MailingListView",
+                     "MailingAttemptListView", "MessageListView"):
+            # За заголовком страницы идет непустой план запроса
+            self.assertIn(view, lines)
+            self.assertTrue(lines[lines.index(view) + 1].strip(), view)
+
+    def test_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command("explain_views", "--user", "nobody@example.com", stdout=StringIO())
@@ -0,0 +1,128 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from mailing import stampede
+from mailing.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class _SafeRemote:
+    """Общий кэш для stampede: ошибки Redis не выходят наружу, а трактуются как промах"""
+
+    def __init__(self, tiered):
+        self.tiered = tiered
+
+    def get(self, key):
+        value = self.tiered._remote_call("get", key)
+        return None if value is MISSING else value
+
+    def add(self, key, value, timeout):
+        # Без Redis блокировку считаем захваченной: значение посчитает этот процесс
+        return self.tiered._remote_call("add", key, value, timeout) is not False
+
+    def set(self, key, value, timeout):
+        self.tiered._remote_call("set", key, value, timeout)
+
+    def delete(self, key):
+        self.tiered._remote_call("delete", key)
+
+
+class TieredCache:
+    """Кэш с чтением насквозь: LRU в памяти процесса перед общим кэшем Django (Redis).
+
+    Ключи версионируются по пространству имен: invalidate() повышает версию в общем кэше и
+    очищает локальные записи, другие процессы увидят новую версию не позже срока жизни LRU.
+    Если общий кэш выключен (CACHE_ENABLE) или недоступен, работает только локальный уровень,
+    а после ошибки обращения к Redis следующие RETRY_AFTER секунд он не опрашивается.
+    В Redis значения пересчитываются с защитой от лавины запросов (mailing.stampede).
+    """
+
+    RETRY_AFTER = 30
+
+    def __init__(self, namespace, maxsize=None, local_ttl=None, timeout=None, alias="default"):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize or settings.MAILING_LOCAL_CACHE_SIZE,
+                              settings.MAILING_LOCAL_CACHE_TTL if local_ttl is None else local_ttl)
+        self.timeout = timeout or settings.MAILING_CACHE_TIMEOUT
+        self.alias = alias
+        self._remote_down_until = 0.0
+        self._local_version = 1
+
+    @property
+    def remote(self):
+        if not settings.CACHE_ENABLE or time.monotonic() < self._remote_down_until:
+            return None
+        return caches[self.alias]
+
+    def _remote_call(self, method, *args):
+        remote = self.remote
+        if remote is None:
+            return MISSING
+        try:
+            return getattr(remote, method)(*args)
+        except ValueError:
+            # incr отсутствующего ключа - обычная ситуация, а не отказ Redis
+            raise
+        except Exception as error:  # у бэкендов кэша нет общего базового исключения
+            logger.warning("Общий кэш недоступен, используется только локальный: %s", error)
+            self._remote_down_until = time.monotonic() + self.RETRY_AFTER
+            return MISSING
+
+    @property
+    def version_key(self):
+        return f"{self.namespace}:version"
+
+    def version(self):
+        version = self.local.get(self.version_key)
+        if version is None:
+            version = self._remote_call("get", self.version_key)
+            if version is None:
+                # Версия вытеснена из Redis: начинаем с новой, чтобы не ожили значения старых версий
+                self._remote_call("add", self.version_key, time.time_ns(), None)
+                version = self._remote_call("get", self.version_key)
+            if version in (MISSING, None):
+                version = f"local{self._local_version}"
+            self.local.set(self.version_key, version)
+        return version
+
+    def key(self, name):
+        return f"{self.namespace}:{self.version()}:{name}"
+
+    def get(self, name, default=None):
+        key = self.key(name)
+        value = self.local.get(key, MISSING)
+        if value is MISSING:
+            entry = self._remote_call("get", key)
+            if entry in (MISSING, None):
+                return default
+            value = entry[0]
+            self.local.set(key, value)
+        return value
+
+    def get_or_set(self, name, loader):
+        """Значение из кэша, при промахе - из loader() с сохранением на обоих уровнях"""
+        key = self.key(name)
+        value = self.local.get(key, MISSING)
+        if value is MISSING:
+            if self.remote is None:
+                value = loader()
+            else:
+                value = stampede.get_or_compute(key, loader, self.timeout, cache=_SafeRemote(self))
+            self.local.set(key, value)
+        return value
+
+    def invalidate(self):
+        """Новая версия пространства имен: все ранее сохраненные значения становятся недоступны"""
+        self._local_version += 1
+        try:
+            self._remote_call("incr", self.version_key)
+        except ValueError:
+            pass
+        # Локальный уровень принадлежит только этому пространству имен
+        self.local.clear()
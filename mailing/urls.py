@@ -1,35 +1,52 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from mailing import views
+from mailing.models import Mailing, MailingAttempt, Message, RecipientMailing
+from mailing.view_cache import cache_view
+from users.models import User
 
 app_name = 'mailing'
 
+# Кэш страниц по пользователю и версиям объектов, версии повышаются сигналами при изменении данных.
+# Страницы с email владельца зависят и от версии списка пользователей
+recipientmailing_detail = cache_view("recipientmailing_detail", RecipientMailing)(
+    views.RecipientMailingDetailView.as_view()
+)
+message_list = cache_view("message_list", Message, depends_on=[User])(views.MessageListView.as_view())
+message_detail = cache_view("message_detail", Message)(views.MessageDetailView.as_view())
+mailing_detail = cache_view("mailing_detail", Mailing, depends_on=[Message, RecipientMailing, User])(
+    views.MailingDetailView.as_view()
+)
+attempt_list = cache_view("attempt", MailingAttempt, depends_on=[Mailing, Message, User])(
+    views.MailingAttemptListView.as_view()
+)
+
 urlpatterns = [path("home/", views.IndexView.as_view(), name="home"),
                path("contacts/", views.ContactsTemplateView.as_view(), name="contacts"),
                path("recipientmailings/", views.RecipientMailingListView.as_view(),
                     name="recipientmailing_list"),
-               path("recipientmailing/<int:pk>/detail/", cache_page(60)(views.RecipientMailingDetailView.as_view()),
-                    name="recipientmailing_detail"),
+               path("recipientmailing/<int:pk>/detail/", recipientmailing_detail, name="recipientmailing_detail"),
                path("recipientmailing/create/", views.RecipientMailingCreateView.as_view(),
                     name="recipientmailing_create"),
+               path("recipientmailing/import/", views.RecipientMailingImportView.as_view(),
+                    name="recipientmailing_import"),
                path("recipientmailing/<int:pk>/update/", views.RecipientMailingUpdateView.as_view(),
                     name="recipientmailing_update"),
                path("recipientmailing/<int:pk>/delete/", views.RecipientMailingDeleteView.as_view(),
                     name="recipientmailing_delete", ),
-               path("messages/", cache_page(60)(views.MessageListView.as_view()), name="message_list"),
-               path("message/<int:pk>/detail/", cache_page(60)(views.MessageDetailView.as_view()),
-                    name="message_detail"),
+               path("messages/", message_list, name="message_list"),
+               path("message/<int:pk>/detail/", message_detail, name="message_detail"),
                path("message/create/", views.MessageCreateView.as_view(), name="message_create"),
                path("message/<int:pk>/update/", views.MessageUpdateView.as_view(), name="message_update"),
                path("message/<int:pk>/delete/", views.MessageDeleteView.as_view(), name="message_delete"),
                path("mailings/", views.MailingListView.as_view(), name="mailing_list"),
-               path("mailing/<int:pk>/detail/", cache_page(60)(views.MailingDetailView.as_view()),
-                    name="mailing_detail"),
+               path("mailing/<int:pk>/detail/", mailing_detail, name="mailing_detail"),
                path("mailing/create/", views.MailingCreateView.as_view(), name="mailing_create"),
                path("mailing/<int:pk>/update/", views.MailingUpdateView.as_view(), name="mailing_update"),
                path("mailing/<int:pk>/delete/", views.MailingDeleteView.as_view(), name="mailing_delete"),
                path("<int:pk>/mailing_send/", views.MailingSendView.as_view(), name="mailing_send"),
                path("<int:pk>/mailing_stop/", views.MailingStopSendView.as_view(), name="mailing_stop"),
-               path("attempts/", cache_page(60)(views.MailingAttemptListView.as_view()), name="attempt"),
+               path("attempts/", attempt_list, name="attempt"),
+               path("attempts/export/", views.MailingAttemptExportView.as_view(), name="attempt_export"),
+               path("deliveries/export/", views.MailingDeliveryExportView.as_view(), name="delivery_export"),
                ]
@@ -0,0 +1,146 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from mailing import stampede
+from users import roles
+
+STATS_KEY = "viewcache:stats"
+PAGE_WAIT_TIMEOUT = 1
+
+
+def _version_key(model, scope):
+    return f"viewcache:version:{model._meta.label_lower}:{scope}"
+
+
+def _versions(keys):
+    """Текущие версии; пропавшая из кэша версия заменяется новой, а не нулем, чтобы не ожили старые страницы"""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Версии нет в кэше: при следующем чтении будет создана новая
+            pass
+
+
+def object_changed(model, pk):
+    """Изменение объекта: сбрасываются его детальная страница и списки модели"""
+    _bump([_version_key(model, pk), _version_key(model, "list")])
+
+
+def objects_changed(model, pks=None):
+    """Массовое изменение (UPDATE без сигналов); без списка pk сбрасываются все страницы модели"""
+    if pks is None:
+        _bump([_version_key(model, "all")])
+    else:
+        _bump([_version_key(model, pk) for pk in pks] + [_version_key(model, "list")])
+
+
+def _record(view_name, outcome):
+    key = f"{STATS_KEY}:{view_name}:{outcome}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def get_stats(view_names):
+    """Количество попаданий и промахов по каждому представлению"""
+    keys = {f"{STATS_KEY}:{name}:{outcome}": (name, outcome) for name in view_names for outcome in ("hit", "miss")}
+    stats = {name: {"hit": 0, "miss": 0} for name in view_names}
+    for key, value in cache.get_many(keys).items():
+        name, outcome = keys[key]
+        stats[name][outcome] = value
+    return stats
+
+
+def reset_stats(view_names):
+    cache.delete_many([f"{STATS_KEY}:{name}:{outcome}" for name in view_names for outcome in ("hit", "miss")])
+
+
+CACHED_VIEWS = []
+
+
+def cache_view(view_name, model, depends_on=(), timeout=None):
+    """Кэш страницы отдельно для каждого пользователя с версионированием вместо истечения по времени.
+
+    Ключ включает pk объекта (для детальных страниц) или версию списка модели, версии моделей из
+    depends_on, пользователя, версию ролей и CSRF-cookie (токен формы выхода в шапке). Сигналы
+    сохранения и удаления повышают версии, поэтому закэшированная страница никогда не устаревает
+    и может храниться долго. Кэшируются только успешные GET-ответы авторизованных пользователей.
+
+    Без общего кэша (CACHE_ENABLE) страницы не кэшируются: версии в локальном кэше процесса
+    не видят изменений, сделанных воркером, планировщиком и другими процессами веб-сервера.
+    """
+    CACHED_VIEWS.append(view_name)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            if not settings.CACHE_ENABLE or request.method not in ("GET", "HEAD") or not user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            pk = kwargs.get("pk")
+            version_keys = [_version_key(model, "all"), _version_key(model, pk if pk is not None else "list")]
+            version_keys += [_version_key(dependency, "list") for dependency in depends_on]
+            version_keys.append(_version_key(user.__class__, user.pk))
+            versions = _versions(version_keys)
+            variant = hashlib.md5(
+                f"{request.get_full_path()}|{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}".encode()
+            ).hexdigest()
+            versions.append(roles.get_version())
+            key = f"viewcache:page:{view_name}:{pk}:{user.pk}:{':'.join(map(str, versions))}:{variant}"
+
+            content = cache.get(key)
+            if content is not None:
+                _record(view_name, "hit")
+                return content
+
+            _record(view_name, "miss")
+            # Одну и ту же страницу рендерит один запрос, параллельные недолго ждут его результат
+            locked = stampede.acquire(key)
+            if not locked:
+                content = stampede.wait_for(lambda: cache.get(key), timeout=PAGE_WAIT_TIMEOUT)
+                if content is not None:
+                    return content
+
+            def unlock():
+                if locked:
+                    stampede.release(key)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                unlock()
+                raise
+            if response.status_code != 200 or response.streaming:
+                unlock()
+                return response
+
+            def store(rendered):
+                cache.set(key, rendered, timeout or settings.VIEW_CACHE_TIMEOUT)
+                unlock()
+
+            if hasattr(response, "render") and callable(response.render):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+
+        return wrapper
+
+    return decorator
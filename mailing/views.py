@@ -1,18 +1,22 @@
-import smtplib
-
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 from django.core.mail import send_mail
-from django.http import HttpResponseForbidden, HttpResponse
-from django.shortcuts import render
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, StreamingHttpResponse
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
-from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from django.views.generic import ListView, DetailView, TemplateView
+from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
+from django.views.generic import ListView, DetailView, TemplateView, View
 
-from mailing.forms import RecipientForm, MessageForm, MailingForm
+from mailing.counters import get_home_counters
+from mailing import exports
+from mailing.forms import RecipientForm, RecipientImportForm, MessageForm, MailingForm
 from mailing.models import RecipientMailing, Message, Mailing, MailingAttempt
-from mailing.services import send_mailing, get_mailing_from_cache
+from mailing.pagination import PAGE_SIZE, KeysetPaginationMixin
+from mailing.recipient_import import import_recipients, read_csv
+from mailing.services import enqueue_mailing
+from users.roles import is_manager
 
 
 class IndexView(TemplateView):
@@ -21,24 +25,9 @@ class IndexView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-
-        context["user_mail"] = RecipientMailing.objects.all()
-        context["mailing_all_started"] = Mailing.objects.filter(status="Запущена")
-        context["mailings"] = Mailing.objects.all()
-
-        if user.is_authenticated:
-            context['user_usermail'] = RecipientMailing.objects.filter(owner=user)
-            context['user_mailing_started'] = Mailing.objects.filter(owner=user, status="Запущена")
-            context['user_mailings'] = Mailing.objects.filter(owner=user)
-
+        context["counters"] = get_home_counters(self.request.user)  # из файла counters.py
         return context
 
-    @staticmethod
-    def get_queryset(self):
-        """Настройка серверного кэширования главной страницы"""
-        return get_mailing_from_cache()
-
 
 class RecipientMailingCreateView(LoginRequiredMixin, CreateView):
     """Класс для создания получателя рассылки"""
@@ -55,16 +44,29 @@ class RecipientMailingCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class RecipientMailingListView(ListView):
+class RecipientMailingListView(KeysetPaginationMixin, ListView):
     """Класс для отображения всех получателей рассылки"""
     model = RecipientMailing
 
     def get_queryset(self):
         user = self.request.user
+        queryset = RecipientMailing.objects.select_related("owner")
 
-        if user.groups.filter(name="Менеджеры") or user.is_superuser:
-            return RecipientMailing.objects.all()
-        return RecipientMailing.objects.filter(owner=user)
+        if is_manager(user):
+            return queryset.all()
+        return queryset.filter(owner=user)
+
+
+class RecipientMailingImportView(LoginRequiredMixin, FormView):
+    """Класс для массовой загрузки получателей из CSV-файла"""
+    form_class = RecipientImportForm
+    template_name = "mailing/recipientmailing_import.html"
+
+    def form_valid(self, form):
+        # Файлы больше FILE_UPLOAD_MAX_MEMORY_SIZE Django уже сохранил во временный файл, читаем его потоково
+        upload = form.cleaned_data["file"]
+        result = import_recipients(read_csv(upload.file), self.request.user)
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
 
 
 class RecipientMailingDetailView(LoginRequiredMixin, DetailView):
@@ -75,7 +77,7 @@ class RecipientMailingDetailView(LoginRequiredMixin, DetailView):
     def get_object(self, queryset=None):
         user = self.request.user
         self.object = super().get_object(queryset)
-        if user.groups.filter(name="Менеджеры") or user.is_superuser:
+        if is_manager(user):
             return self.object
         if self.object.owner != user and not user.is_superuser:
             raise PermissionDenied
@@ -127,6 +129,9 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
 class MessageListView(ListView):
     """Класс для отображения всех сообщений"""
     model = Message
+    paginate_by = PAGE_SIZE
+    # Только поля, которые выводит шаблон списка: HTML-версия, вложение и данные владельца не читаются
+    queryset = Message.objects.select_related("owner").only("theme", "content", "owner__email")
 
 
 class MessageDetailView(LoginRequiredMixin, DetailView):
@@ -188,13 +193,20 @@ class MailingListView(ListView):
     """Класс для отображения всех рассылок"""
     model = Mailing
     context_object_name = 'mailings'
+    paginate_by = PAGE_SIZE
 
     def get_queryset(self):
         user = self.request.user
+        # Сообщение подтягиваем JOIN'ом, адреса получателей - одним запросом на всю страницу
+        queryset = (
+            Mailing.objects.select_related("message")
+            .only("first_sending", "end_sending", "status", "owner", "message__content")
+            .prefetch_related(Prefetch("recipients", queryset=RecipientMailing.objects.only("id", "email")))
+        )
 
-        if user.groups.filter(name="Менеджеры") or user.is_superuser:
-            return Mailing.objects.all()
-        return Mailing.objects.filter(owner=user)
+        if is_manager(user):
+            return queryset.all()
+        return queryset.filter(owner=user)
 
 
 class MailingDetailView(LoginRequiredMixin, DetailView):
@@ -206,7 +218,7 @@ class MailingDetailView(LoginRequiredMixin, DetailView):
     def get_object(self, queryset=None):
         user = self.request.user
         self.object = super().get_object(queryset)
-        if user.groups.filter(name="Менеджеры") or user.is_superuser:
+        if is_manager(user):
             return self.object
         if self.object.owner != user and not user.is_superuser:
             raise PermissionDenied
@@ -240,22 +252,13 @@ class MailingDeleteView(LoginRequiredMixin, DeleteView):
         return super().dispatch(request, *args, **kwargs)
 
 
-class MailingSendView(LoginRequiredMixin, DetailView):
-    """Класс для отправки рассылки"""
-    model = Mailing
-    template_name = "mailing/mailing_send.html"
-    context_object_name = "mailing_send"
-
-    def get_object(self, queryset=None):
-        user = self.request.user
-        self.object = super().get_object(queryset)
+class MailingSendView(LoginRequiredMixin, View):
+    """Класс для запуска рассылки: ставит отправку в очередь и сразу возвращает ответ"""
 
-        if self.object.owner == user and self.object.status == "Создана":
-            try:
-                send_mailing(self)  # из файла services.py
-            except smtplib.SMTPException as error:
-                MailingAttempt.objects.create(mailing=self.object, mail_response=error, status="Не успешно")
-        return self.object
+    def get(self, request, pk):
+        mailing = get_object_or_404(Mailing, pk=pk, owner=request.user)
+        enqueue_mailing(mailing, request.user)  # из файла services.py, отправляет воркер run_mailing_worker
+        return redirect("mailing:mailing_list")
 
 
 class MailingStopSendView(LoginRequiredMixin, DetailView):
@@ -267,7 +270,7 @@ class MailingStopSendView(LoginRequiredMixin, DetailView):
     def get_object(self, queryset=None):
         user = self.request.user
         self.object = super().get_object(queryset)
-        if user.has_perm("can_stop_mailing"):
+        if user.has_perm("users.can_stop_mailing"):
             self.object.status = "Отключена"
             self.object.save()
         return self.object
@@ -286,14 +289,50 @@ class MailingAttemptCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class MailingAttemptListView(LoginRequiredMixin, ListView):
+class MailingAttemptListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Класс для отображения статистики всех рассылок"""
     model = MailingAttempt
     context_object_name = "attempts"
     template_name = "mailing/mailingattempt_list.html"
 
     def get_queryset(self):
-        return MailingAttempt.objects.filter(owner=self.request.user)
+        return (
+            MailingAttempt.objects.filter(owner=self.request.user)
+            .select_related("mailing__message", "mailing__owner")
+            .only("date_attempt", "status", "server_response", "mailing__message__theme",
+                  "mailing__message__content", "mailing__owner__email")
+        )
+
+
+class StatisticsExportView(LoginRequiredMixin, View):
+    """Базовый класс потоковой выгрузки статистики в CSV"""
+    filename = None
+    columns = None
+    queryset_factory = None  # функция (параметры, пользователь, менеджер ли) -> QuerySet выгрузки
+
+    def get(self, request):
+        user = request.user
+        try:
+            queryset = self.queryset_factory(request.GET, user, is_manager(user))
+        except exports.ExportFilterError as error:
+            return HttpResponseBadRequest(str(error))
+        response = StreamingHttpResponse(exports.stream_csv(queryset, self.columns), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{self.filename}"'
+        return response
+
+
+class MailingAttemptExportView(StatisticsExportView):
+    """Класс для выгрузки попыток рассылок в CSV"""
+    filename = "attempts.csv"
+    columns = exports.ATTEMPT_COLUMNS
+    queryset_factory = staticmethod(exports.attempts_queryset)
+
+
+class MailingDeliveryExportView(StatisticsExportView):
+    """Класс для выгрузки доставок по получателям в CSV"""
+    filename = "deliveries.csv"
+    columns = exports.DELIVERY_COLUMNS
+    queryset_factory = staticmethod(exports.deliveries_queryset)
 
 
 class ContactsTemplateView(TemplateView):
@@ -0,0 +1,19 @@
+from django.contrib.auth.backends import ModelBackend
+
+from users.roles import get_roles
+
+
+class CachedRolesBackend(ModelBackend):
+    """Бэкенд авторизации, который берет права из сервиса ролей вместо отдельных запросов ModelBackend"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return set(get_roles(user_obj).permissions)
+
+    def get_user_permissions(self, user_obj, obj=None):
+        # Личные права и права групп загружаются одним запросом и не различаются
+        return self.get_all_permissions(user_obj, obj)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        return self.get_all_permissions(user_obj, obj)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Concat
+
+MANAGERS_GROUP = "Менеджеры"
+
+ROLES_TIMEOUT = 60 * 60
+VERSION_KEY = "roles:version"
+
+
+class UserRoles:
+    """Группы и права пользователя ("app_label.codename"), загруженные одним запросом"""
+
+    def __init__(self, groups=(), permissions=()):
+        self.groups = frozenset(groups)
+        self.permissions = frozenset(permissions)
+
+
+def get_version():
+    """Текущая версия ролей, повышается при любом изменении групп и прав"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def _rows(queryset, kind, label):
+    """Строки (вид, имя) для объединения запросов в UNION"""
+    return queryset.order_by().annotate(kind=Value(kind, output_field=CharField()), label=label).values_list(
+        "kind", "label"
+    )
+
+
+def _permission_names(permissions):
+    return _rows(permissions, "perm", Concat(F("content_type__app_label"), Value("."), F("codename"),
+                                             output_field=CharField()))
+
+
+def load_roles(user):
+    """Группы и права пользователя из БД одним запросом (UNION групп, личных прав и прав групп)"""
+    querysets = [_rows(Group.objects.filter(user=user), "group", F("name"))]
+    if user.is_superuser:
+        querysets.append(_permission_names(Permission.objects.all()))
+    else:
+        querysets.append(_permission_names(Permission.objects.filter(user=user)))
+        querysets.append(_permission_names(Permission.objects.filter(group__user=user)))
+
+    groups, permissions = set(), set()
+    for kind, name in querysets[0].union(*querysets[1:], all=True):
+        (groups if kind == "group" else permissions).add(name)
+    return UserRoles(groups, permissions)
+
+
+def get_roles(user):
+    """Роли пользователя: один раз за запрос (на объекте пользователя) и в кэше до смены групп и прав.
+
+    Между запросами роли кэшируются только в общем кэше (CACHE_ENABLE): в локальном кэше процесса
+    сброс версии после отзыва прав не виден другим процессам.
+    """
+    if not getattr(user, "is_authenticated", False):
+        return UserRoles()
+    roles = getattr(user, "_roles_cache", None)
+    if roles is None and not settings.CACHE_ENABLE:
+        roles = user._roles_cache = load_roles(user)
+    elif roles is None:
+        key = f"roles:{get_version()}:{user.pk}:{int(user.is_superuser)}"
+        roles = cache.get(key)
+        if roles is None:
+            roles = load_roles(user)
+            cache.set(key, roles, ROLES_TIMEOUT)
+        user._roles_cache = roles
+    return roles
+
+
+def has_group(user, group_name):
+    return group_name in get_roles(user).groups
+
+
+def is_manager(user):
+    """Менеджер или суперпользователь видит данные всех пользователей"""
+    return user.is_superuser or has_group(user, MANAGERS_GROUP)
+
+
+def invalidate():
+    """Сброс закэшированных ролей всех пользователей после изменения групп или прав"""
+    if not settings.CACHE_ENABLE:
+        return
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
@@ -1,3 +1,65 @@
-from django.test import TestCase
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from users.models import User
+from users.roles import MANAGERS_GROUP, get_roles, is_manager
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "roles-tests"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CACHE_ENABLE=True)
+class RolesTest(TestCase):
+    """Группы и права пользователя загружаются одним запросом и кэшируются до их изменения"""
+
+    def setUp(self):
+        cache.clear()
+        self.managers = Group.objects.create(name=MANAGERS_GROUP)
+        self.managers.permissions.add(Permission.objects.get(codename="can_stop_mailing"))
+        self.user = User.objects.create(email="manager@example.com", username="manager")
+        self.user.groups.add(self.managers)
+        for index in range(10):
+            User.objects.create(email=f"user{index}@example.com", username=f"user{index}")
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_roles_loaded_with_one_query(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(user))
+            self.assertTrue(user.has_perm("users.can_stop_mailing"))
+            self.assertFalse(user.has_perm("users.can_block_user"))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_manager(user))
+
+    def test_group_change_invalidates_cache(self):
+        self.assertTrue(is_manager(self.fresh_user()))
+        self.user.groups.remove(self.managers)
+        self.assertFalse(is_manager(self.fresh_user()))
+        self.user.user_permissions.add(Permission.objects.get(codename="can_block_user"))
+        self.assertEqual(get_roles(self.fresh_user()).permissions, {"users.can_block_user"})
+
+    def test_user_list_issues_one_auth_query(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("users:users"))
+        self.assertEqual(response.status_code, 200)
+        auth_queries = [query for query in context.captured_queries if "auth_group" in query["sql"]
+                        or "auth_permission" in query["sql"]]
+        self.assertEqual(len(auth_queries), 1)
+
+    @override_settings(CACHE_ENABLE=False)
+    def test_roles_not_shared_without_common_cache(self):
+        """Без общего кэша роли загружаются в каждом запросе: отзыв прав в другом процессе виден сразу"""
+        self.assertTrue(is_manager(self.fresh_user()))
+        # Изменение в другом процессе не сбрасывает версию в кэше этого процесса
+        User.groups.through.objects.filter(user=self.user).delete()
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertFalse(is_manager(user))
+            self.assertFalse(is_manager(user))
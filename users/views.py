@@ -9,6 +9,7 @@ from django.views.generic import CreateView, ListView, DetailView, UpdateView, T
 from config import settings
 from users.forms import CustomUserCreationForm, UserUpdateForm, PasswordRecoveryForm
 from users.models import User
+from users.roles import is_manager
 
 
 class UserRegisterView(CreateView):
@@ -42,7 +43,7 @@ class UserListView(LoginRequiredMixin, ListView):
     template_name = "users/user_list.html"
 
     def handle_permission(self):
-        return self.request.user.groups.filter(name="Менеджеры").exists() or self.request.user.is_superuser
+        return is_manager(self.request.user)
 
 
 class UserDetailView(LoginRequiredMixin, DetailView):